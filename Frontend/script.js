@@ -29,65 +29,87 @@ const seriesData = (arr, key) => {
   return Array.from(map.values()).sort((a, b) => a.time - b.time);
 };
 
+// ===== DELTA STATE =====
+// Cursors from the last /api/snapshots and /api/chartdata responses; each poll
+// only asks for what was appended after them.
+let snapshotCursor = "";
+let chartCursor = "";
+const latestSnapshot = {};
+const levelsData = {};
+const chartHandles = {};
+
 // ========= TABLE LOADING =======
 async function loadData() {
   try {
     const [snapRes, niftyRes, bankniftyRes, sensexRes] = await Promise.all([
-      fetch('http://127.0.0.1:5000/api/snapshots'),
+      fetch(`http://127.0.0.1:5000/api/snapshots?since=${encodeURIComponent(snapshotCursor)}`),
       fetch('http://127.0.0.1:5000/api/levels/levels_NIFTY_50.json'),
       fetch('http://127.0.0.1:5000/api/levels/levels_NIFTY_BANK.json'),
       fetch('http://127.0.0.1:5000/api/levels/levels_SENSEX.json')
     ]);
 
-    const snapshots = await snapRes.json();
-    const levelsData = {
-      NIFTY: await niftyRes.json(),
-      BANKNIFTY: await bankniftyRes.json(),
-      SENSEX: await sensexRes.json()
-    };
-
-    const tbody = document.querySelector("#dataTable tbody");
-    tbody.innerHTML = "";
-
+    const snapDelta = await snapRes.json();
+    snapshotCursor = snapDelta.cursor;
     INDICES.forEach(symbol => {
-      const lines = snapshots[symbol];
-      const levels = levelsData[symbol];
-      let ltp = 0;
-      if (lines && lines.length > 0) {
-        const latestLine = lines[lines.length - 1];
-        ltp = extractFirstLTP(latestLine);
-      }
-      const row = document.createElement("tr");
-      row.innerHTML = `
-        <td><b>${symbol}</b></td>
-        <td>-</td>
-        <td>${ltp}</td>
-        <td>-</td>
-        <td>-</td>
-        <td>-</td>
-        <td>-</td>
-        <td>-</td>
-        <td class="${color(levels.PDH, ltp)}">${status(levels.PDH, ltp)}</td>
-        <td class="${color(levels.PDL, ltp)}">${status(levels.PDL, ltp)}</td>
-        <td class="${color(levels.CWH, ltp)}">${status(levels.CWH, ltp)}</td>
-        <td class="${color(levels.CWL, ltp)}">${status(levels.CWL, ltp)}</td>
-        <td class="${color(levels.PWH, ltp)}">${status(levels.PWH, ltp)}</td>
-        <td class="${color(levels.PWL, ltp)}">${status(levels.PWL, ltp)}</td>
-        <td class="${color(levels.PMH, ltp)}">${status(levels.PMH, ltp)}</td>
-        <td class="${color(levels.PML, ltp)}">${status(levels.PML, ltp)}</td>
-      `;
-      tbody.appendChild(row);
+      const records = snapDelta.data[symbol] || [];
+      if (snapDelta.reset) delete latestSnapshot[symbol];
+      if (records.length > 0) latestSnapshot[symbol] = records[records.length - 1];
     });
-
-    const lastUpdatedElem = document.getElementById('lastUpdated');
-    const timeString = new Date().toLocaleTimeString("en-IN", { hour12: false, timeZone: "Asia/Kolkata" });
-    lastUpdatedElem.textContent = "Last updated: " + timeString;
-
+    levelsData.NIFTY = await niftyRes.json();
+    levelsData.BANKNIFTY = await bankniftyRes.json();
+    levelsData.SENSEX = await sensexRes.json();
+    renderTable();
   } catch (err) {
     console.error("Error loading data:", err);
   }
 }
 
+function renderTable() {
+  const tbody = document.querySelector("#dataTable tbody");
+  tbody.innerHTML = "";
+
+  INDICES.forEach(symbol => {
+    const levels = levelsData[symbol] || {};
+    const latest = latestSnapshot[symbol];
+    const ltp = (latest && latest.ltp) || 0;
+    const row = document.createElement("tr");
+    row.innerHTML = `
+      <td><b>${symbol}</b></td>
+      <td>-</td>
+      <td>${ltp}</td>
+      <td>-</td>
+      <td>-</td>
+      <td>-</td>
+      <td>-</td>
+      <td>-</td>
+      <td class="${color(levels.PDH, ltp)}">${status(levels.PDH, ltp)}</td>
+      <td class="${color(levels.PDL, ltp)}">${status(levels.PDL, ltp)}</td>
+      <td class="${color(levels.CWH, ltp)}">${status(levels.CWH, ltp)}</td>
+      <td class="${color(levels.CWL, ltp)}">${status(levels.CWL, ltp)}</td>
+      <td class="${color(levels.PWH, ltp)}">${status(levels.PWH, ltp)}</td>
+      <td class="${color(levels.PWL, ltp)}">${status(levels.PWL, ltp)}</td>
+      <td class="${color(levels.PMH, ltp)}">${status(levels.PMH, ltp)}</td>
+      <td class="${color(levels.PML, ltp)}">${status(levels.PML, ltp)}</td>
+    `;
+    tbody.appendChild(row);
+  });
+
+  const lastUpdatedElem = document.getElementById('lastUpdated');
+  const timeString = new Date().toLocaleTimeString("en-IN", { hour12: false, timeZone: "Asia/Kolkata" });
+  lastUpdatedElem.textContent = "Last updated: " + timeString;
+}
+
+function convertData(data, key) {
+  return data
+    .map(d => {
+      if (!d.time) return null;
+      return { time: convertTimeToTS(d.time), value: d[key] };
+    })
+    .filter(pt => pt && pt.value != null && pt.value !== 0)
+    .sort((a, b) => a.time - b.time)
+    .filter((pt, idx, arr) => idx === 0 || pt.time > arr[idx - 1].time);
+}
+
 // ========== GENERALIZED DUAL AXIS CHART ===============
 function createDualAxisChart({
   containerId,
@@ -148,29 +170,20 @@ function createDualAxisChart({
   chart.priceScale("left").applyOptions({ scaleMargins: { top: 0.08, bottom: 0.08 } });
   chart.priceScale("right").applyOptions({ scaleMargins: { top: 0.08, bottom: 0.08 } });
 
-  function convertData(data, key) {
-    return data
-      .map(d => {
-        if (!d.time) return null;
-        const [hh, mm] = String(d.time).split(":").map(Number);
-        const dateObj = new Date();
-        dateObj.setHours(hh, mm, 0, 0);
-        return { time: convertTimeToTS(d.time), value: d[key] };
-      })
-      .filter(pt => pt && pt.value != null && pt.value !== 0)
-      .sort((a, b) => a.time - b.time)
-      .filter((pt, idx, arr) => idx === 0 || pt.time > arr[idx - 1].time);
-  }
-
-  const ltpData = convertData(data, "ltp");
-  const ltpMAData = convertData(data, "ltp_ma");
-  const rightData = convertData(data, rightSeriesKey);
-  const rightMAData = convertData(data, rightSeriesMAKey);
-
-  chart.addLineSeries({ priceScaleId: "left", color: COLORS.ltp, lineWidth: 2 }).setData(ltpData);
-  chart.addLineSeries({ priceScaleId: "left", color: COLORS.ltp_ma, lineWidth: 2, lineStyle: DASHED }).setData(ltpMAData);
-  chart.addLineSeries({ priceScaleId: "right", color: rightColor, lineWidth: 2 }).setData(rightData);
-  chart.addLineSeries({ priceScaleId: "right", color: rightColorMA, lineWidth: 2, lineStyle: DASHED }).setData(rightMAData);
+  const keys = ["ltp", "ltp_ma", rightSeriesKey, rightSeriesMAKey];
+  const styles = [
+    { priceScaleId: "left", color: COLORS.ltp, lineWidth: 2 },
+    { priceScaleId: "left", color: COLORS.ltp_ma, lineWidth: 2, lineStyle: DASHED },
+    { priceScaleId: "right", color: rightColor, lineWidth: 2 },
+    { priceScaleId: "right", color: rightColorMA, lineWidth: 2, lineStyle: DASHED }
+  ];
+  const handle = { series: {}, lastTime: {} };
+  keys.forEach((key, i) => {
+    const points = convertData(data, key);
+    handle.series[key] = chart.addLineSeries(styles[i]);
+    handle.series[key].setData(points);
+    handle.lastTime[key] = points.length ? points[points.length - 1].time : 0;
+  });
 
   // --- ALWAYS 09:15 to 15:30 IST as visible range ---
   const today = new Date();
@@ -194,19 +207,43 @@ function createDualAxisChart({
       </span>
     </div>`
   );
+  return handle;
+}
+
+// Push only the new points into an existing chart's series
+function appendToChart(handle, data) {
+  Object.keys(handle.series).forEach(key => {
+    convertData(data, key).forEach(pt => {
+      if (pt.time >= handle.lastTime[key]) {
+        handle.series[key].update(pt);
+        handle.lastTime[key] = pt.time;
+      }
+    });
+  });
 }
 
 // =========== LOAD ALL CHARTS =============
 async function loadAllCharts() {
   try {
-    const res = await fetch("http://127.0.0.1:5000/api/chartdata");
-    const data = await res.json();
+    const res = await fetch(`http://127.0.0.1:5000/api/chartdata?since=${encodeURIComponent(chartCursor)}`);
+    const delta = await res.json();
+    chartCursor = delta.cursor;
 
     INDICES.forEach(symbol => {
+      const points = delta.data[symbol] || [];
+      const oiId = `chart_${symbol}_OI`;
+      const dexId = `chart_${symbol}_DEX`;
+
+      if (!delta.reset && chartHandles[oiId] && chartHandles[dexId]) {
+        appendToChart(chartHandles[oiId], points);
+        appendToChart(chartHandles[dexId], points);
+        return;
+      }
+
       // OI Chart
-      createDualAxisChart({
-        containerId: `chart_${symbol}_OI`,
-        data: data[symbol] || [],
+      chartHandles[oiId] = createDualAxisChart({
+        containerId: oiId,
+        data: points,
         rightSeriesKey: "net_oi_change",
         rightSeriesMAKey: "net_oi_ma",
         rightColor: COLORS.net_oi,
@@ -216,9 +253,9 @@ async function loadAllCharts() {
       });
 
       // DEX Chart
-      createDualAxisChart({
-        containerId: `chart_${symbol}_DEX`,
-        data: data[symbol] || [],
+      chartHandles[dexId] = createDualAxisChart({
+        containerId: dexId,
+        data: points,
         rightSeriesKey: "net_dex",
         rightSeriesMAKey: "net_dex_ma",
         rightColor: COLORS.net_dex,
@@ -232,22 +269,46 @@ async function loadAllCharts() {
   }
 }
 
-// ========== EXTRACT/HELPERS FOR TABLE ==========
-function extractFirstLTP(text) {
-  try {
-    const parts = text.split("LTP:");
-    for (let i = 1; i < parts.length; i++) {
-      const after = parts[i].trim();
-      const numberStr = after.split(/[\s|]+/)[0];
-      const num = parseFloat(numberStr);
-      if (!isNaN(num) && num > 0) return num;
+// =========== LIVE UPDATES (SSE) =============
+// The collector pushes new snapshots, sentiment points and levels as soon as
+// they are computed; the 30s delta polling stays on as a fallback.
+const LEVEL_SYMBOLS = { "NIFTY 50": "NIFTY", "NIFTY BANK": "BANKNIFTY", "SENSEX": "SENSEX" };
+
+function connectStream() {
+  if (!window.EventSource) return;
+  const source = new EventSource('http://127.0.0.1:5000/api/stream');
+
+  source.addEventListener("snapshot", e => {
+    const data = JSON.parse(e.data);
+    Object.keys(data).forEach(symbol => {
+      const records = data[symbol];
+      if (records.length > 0) latestSnapshot[symbol] = records[records.length - 1];
+    });
+    renderTable();
+  });
+
+  source.addEventListener("chart", e => {
+    const data = JSON.parse(e.data);
+    Object.keys(data).forEach(symbol => {
+      [`chart_${symbol}_OI`, `chart_${symbol}_DEX`].forEach(id => {
+        if (chartHandles[id]) appendToChart(chartHandles[id], data[symbol]);
+      });
+    });
+  });
+
+  source.addEventListener("levels", e => {
+    const levels = JSON.parse(e.data);
+    const symbol = LEVEL_SYMBOLS[levels.symbol];
+    if (symbol) {
+      levelsData[symbol] = levels;
+      renderTable();
     }
-  } catch (e) {
-    console.error("Error extracting LTP:", e);
-  }
-  return 0;
+  });
+
+  source.onerror = () => console.warn("Live stream interrupted, retrying...");
 }
 
+// ========== EXTRACT/HELPERS FOR TABLE ==========
 function status(level, ltp) {
   if (typeof level !== "number" || ltp === 0) return "-";
   return ltp > level ? "ABOVE" : "BELOW";
@@ -294,4 +355,5 @@ function refreshAll() {
 window.onload = () => {
   scheduleRefresh();
   refreshAll();
+  connectStream();
 };
@@ -1,50 +1,75 @@
 import pandas as pd
 import re
 import os
+import math
+import sys
+import numpy as np
+import snapshot_store
+import clock
+from collections import deque
 
 # === PARAMETERS ===
 ROLLING_WINDOW = 13
 DEVIATION_THRESHOLD = 0.3
 CONFIRMATION_STREAK = 2
+ROLLING_M2_DUST = 1e-14     # relative m2 below which a rolling window counts as flat (std 0)
 FILES = {
     'BankNifty': f'backend/data/snapshots_BANKNIFTY_2025-08-13.txt',
     'Nifty': f'backend/data/snapshots_NIFTY_2025-08-13.txt',
     'Sensex': f'backend/data/snapshots_SENSEX_2025-08-13.txt',
 }
 #'BankNifty': f'backend/data/snapshots_BANKNIFTY_{pd.Timestamp.now().strftime("%Y-%m-%d")}.txt',
+# Live runs read today's records for these symbols from snapshot_store
+STORE_SYMBOLS = {
+    'BankNifty': 'BANKNIFTY',
+    'Nifty': 'NIFTY',
+    'Sensex': 'SENSEX',
+}
+
+def sentiment_filename(symbol, day=None):
+    """
+    Name of a symbol's (or 'ALL') sentiment CSV for `day` (default today), shared with the API.
+    """
+    return f'sentiments_{symbol}_{(day or clock.now()).strftime("%d%b")}.csv'
+
 
 # === PARSING ===
+SNAPSHOT_PATTERN = re.compile(
+    r"\|\s*(\d{2}-\d{2}-\d{4} \d{2}:\d{2})\s*\|\s*"
+    r"([A-Z0-9]+)\s*\|\s*"
+    r"EXP:([\d-]+)\s*\|\s*"
+    r"LTP:\s*([\d.,-]+)\s*\|.*?"
+    r"NetOI:\s*([-\d.,]+)",
+    re.IGNORECASE
+)
+
+
+def parse_line(line, symbol):
+    match = SNAPSHOT_PATTERN.search(line)
+    if not match:
+        return None
+    net_oi_change = int(float(match.group(5).replace(',', '')))
+    return {
+        'timestamp': match.group(1),
+        'symbol': symbol,
+        'expiry': match.group(3),
+        'ltp': float(match.group(4).replace(',', '')),
+        'net_oi_change': net_oi_change,
+        'net_dex': net_oi_change * 0.5
+    }
+
+
 def parse_input_file(filepath, symbol):
     rows = []
-    pattern = re.compile(
-        r"\|\s*(\d{2}-\d{2}-\d{4} \d{2}:\d{2})\s*\|\s*"
-        r"([A-Z0-9]+)\s*\|\s*"
-        r"EXP:([\d-]+)\s*\|\s*"
-        r"LTP:\s*([\d.,-]+)\s*\|.*?"
-        r"NetOI:\s*([-\d.,]+)",
-        re.IGNORECASE
-    )
     if not os.path.exists(filepath):
         print(f"⚠️ File not found: {filepath}")
         return pd.DataFrame()
 
     with open(filepath, 'r', encoding='utf-8') as f:
         for i, line in enumerate(f):
-            match = pattern.search(line)
-            if match:
-                timestamp = match.group(1)
-                expiry = match.group(3)
-                ltp = float(match.group(4).replace(',', ''))
-                net_oi_change = int(float(match.group(5).replace(',', '')))
-                net_dex = net_oi_change * 0.5
-                rows.append({
-                    'timestamp': timestamp,
-                    'symbol': symbol,
-                    'expiry': expiry,
-                    'ltp': ltp,
-                    'net_oi_change': net_oi_change,
-                    'net_dex': net_dex
-                })
+            row = parse_line(line, symbol)
+            if row:
+                rows.append(row)
             else:
                 if line.strip():
                     print(f"[Line {i}] ⚠️ Could not parse: {line.strip()}")
@@ -61,46 +86,49 @@ def add_moving_averages(df):
 
 
 # === SENTIMENT LOGIC (updated as per OI principles) ===
-def apply_sentiment_rules(df, dev_threshold):
-    sentiments = []
-    for idx, row in df.iterrows():
-        ltp, ltp_ma, ltp_std = row['ltp'], row['ltp_ma'], row['ltp_std']
-        net_oi, net_oi_ma, net_oi_std = row['net_oi_change'], row['net_oi_ma'], row['net_oi_std']
+def classify(ltp, ltp_ma, ltp_std, net_oi, net_oi_ma, net_oi_std, prev_net_oi_ma, dev_threshold):
+    if pd.isna(ltp_ma) or pd.isna(net_oi_ma) or pd.isna(ltp_std) or pd.isna(net_oi_std):
+        return 'Not enough data'
 
-        if pd.isna(ltp_ma) or pd.isna(net_oi_ma) or pd.isna(ltp_std) or pd.isna(net_oi_std):
-            sentiments.append('Not enough data')
-            continue
+    ltp_significant = abs(ltp - ltp_ma) >= dev_threshold * ltp_std
+    netoi_significant = abs(net_oi - net_oi_ma) >= dev_threshold * net_oi_std
 
-        ltp_significant = abs(ltp - ltp_ma) >= dev_threshold * ltp_std
-        netoi_significant = abs(net_oi - net_oi_ma) >= dev_threshold * net_oi_std
+    if not (ltp_significant or netoi_significant):
+        return 'Sideways/Chop'
 
-        if not (ltp_significant or netoi_significant):
-            sentiments.append('Sideways/Chop')
-            continue
+    if pd.isna(prev_net_oi_ma):
+        return 'Not enough data'
 
-        prev_net_oi_ma = df['net_oi_ma'].shift(1).iloc[idx]
-        if pd.isna(prev_net_oi_ma):
-            sentiments.append('Not enough data')
-            continue
+    direction_net_oi = net_oi_ma - prev_net_oi_ma
 
-        direction_net_oi = net_oi_ma - prev_net_oi_ma
+    if direction_net_oi > 0:  # More positive Net OI
+        if ltp > ltp_ma:
+            return 'Weak Bullish / Caution'
+        return 'Strong Bearish'
+    elif direction_net_oi < 0:  # More negative Net OI
+        if ltp > ltp_ma:
+            return 'Strong Bullish'
+        return 'Weak Bearish / Caution'
+    return 'Neutral'
 
-        if direction_net_oi > 0:  # More positive Net OI
-            if ltp > ltp_ma:
-                sentiments.append('Weak Bullish / Caution')
-            else:
-                sentiments.append('Strong Bearish')
-        elif direction_net_oi < 0:  # More negative Net OI
-            if ltp > ltp_ma:
-                sentiments.append('Strong Bullish')
-            else:
-                sentiments.append('Weak Bearish / Caution')
-        else:
-            sentiments.append('Neutral')
+
+def apply_sentiment_rules(df, dev_threshold):
+    sentiments = []
+    prev_net_oi_mas = df['net_oi_ma'].shift(1)
+    for idx, row in df.iterrows():
+        prev_net_oi_ma = prev_net_oi_mas.iloc[idx]
+        sentiments.append(classify(
+            row['ltp'], row['ltp_ma'], row['ltp_std'],
+            row['net_oi_change'], row['net_oi_ma'], row['net_oi_std'],
+            prev_net_oi_ma, dev_threshold
+        ))
     return sentiments
 
 
 # === STREAK CONFIRMATION ===
+NON_SIGNALS = ['Sideways/Chop', 'Not enough data']
+
+
 def confirm_signals(sentiments, streak):
     confirmed = []
     count = 1
@@ -108,17 +136,93 @@ def confirm_signals(sentiments, streak):
         if i == 0:
             confirmed.append('Not enough data')
             continue
-        if sentiments[i] == sentiments[i-1] and sentiments[i] not in ['Sideways/Chop', 'Not enough data']:
+        if sentiments[i] == sentiments[i-1] and sentiments[i] not in NON_SIGNALS:
             count += 1
         else:
             count = 1
-        if count >= streak and sentiments[i] not in ['Sideways/Chop', 'Not enough data']:
+        if count >= streak and sentiments[i] not in NON_SIGNALS:
             confirmed.append(sentiments[i])
         else:
             confirmed.append('Sideways/Chop')
     return confirmed
 
 
+# === VECTORIZED RULES (same labels as the loops above) ===
+def apply_sentiment_rules_vectorized(df, dev_threshold):
+    if df.empty:
+        return []
+    ltp, ltp_ma, ltp_std = (df[c].to_numpy(dtype=float) for c in ('ltp', 'ltp_ma', 'ltp_std'))
+    net_oi, net_oi_ma, net_oi_std = (df[c].to_numpy(dtype=float) for c in ('net_oi_change', 'net_oi_ma', 'net_oi_std'))
+    prev_net_oi_ma = np.r_[np.nan, net_oi_ma[:-1]]
+
+    missing = np.isnan(ltp_ma) | np.isnan(net_oi_ma) | np.isnan(ltp_std) | np.isnan(net_oi_std)
+    significant = ((np.abs(ltp - ltp_ma) >= dev_threshold * ltp_std) |
+                   (np.abs(net_oi - net_oi_ma) >= dev_threshold * net_oi_std))
+    direction = net_oi_ma - prev_net_oi_ma
+    above = ltp > ltp_ma
+
+    conditions = [
+        missing,
+        ~significant,
+        np.isnan(prev_net_oi_ma),
+        (direction > 0) & above,
+        direction > 0,
+        (direction < 0) & above,
+        direction < 0,
+    ]
+    choices = [
+        'Not enough data',
+        'Sideways/Chop',
+        'Not enough data',
+        'Weak Bullish / Caution',
+        'Strong Bearish',
+        'Strong Bullish',
+        'Weak Bearish / Caution',
+    ]
+    return np.select(conditions, choices, default='Neutral').tolist()
+
+
+def confirm_signals_vectorized(sentiments, streak):
+    labels = np.asarray(sentiments, dtype=object)
+    if len(labels) == 0:
+        return []
+    is_signal = ~np.isin(labels, NON_SIGNALS)
+    # A row continues a run when it repeats the previous (signal) label
+    continues = np.r_[False, labels[1:] == labels[:-1]] & is_signal
+    positions = np.arange(len(labels))
+    run_start = np.maximum.accumulate(np.where(continues, 0, positions))
+    count = positions - run_start + 1
+
+    confirmed = np.where((count >= streak) & is_signal, labels, 'Sideways/Chop')
+    confirmed[0] = 'Not enough data'
+    return confirmed.tolist()
+
+
+def verify_vectorized(df, dev_threshold=DEVIATION_THRESHOLD, streak=CONFIRMATION_STREAK):
+    """
+    Runs the loop and vectorized rules on the same frame (after add_moving_averages)
+    and returns the row indices where their labels differ.
+    """
+    base = apply_sentiment_rules(df, dev_threshold)
+    base_vec = apply_sentiment_rules_vectorized(df, dev_threshold)
+    confirmed = confirm_signals(base, streak)
+    confirmed_vec = confirm_signals_vectorized(base_vec, streak)
+    return [i for i in range(len(df)) if base[i] != base_vec[i] or confirmed[i] != confirmed_vec[i]]
+
+
+def load_ohlc_as_snapshots(csv_path):
+    """
+    Stand-in input for verify_vectorized from a bundled OHLC CSV: Close is used
+    as LTP and the bar-to-bar close change (in paise) as the net OI change.
+    """
+    ohlc = pd.read_csv(csv_path)
+    return pd.DataFrame({
+        'timestamp': ohlc['datetime'],
+        'ltp': ohlc['Close'].astype(float),
+        'net_oi_change': (ohlc['Close'].diff().fillna(0) * 100).round().astype(int),
+    })
+
+
 # === PROCESSING PER SYMBOL ===
 def process_symbol(symbol, filepath):
     print(f"\n📊 Processing {symbol}...")
@@ -127,22 +231,252 @@ def process_symbol(symbol, filepath):
         return df
 
     df = add_moving_averages(df)
-    base_sents = apply_sentiment_rules(df, DEVIATION_THRESHOLD)
-    confirmed_sents = confirm_signals(base_sents, CONFIRMATION_STREAK)
+    base_sents = apply_sentiment_rules_vectorized(df, DEVIATION_THRESHOLD)
+    confirmed_sents = confirm_signals_vectorized(base_sents, CONFIRMATION_STREAK)
 
     col_name = f"Sentiment_SD{DEVIATION_THRESHOLD}_Streak{CONFIRMATION_STREAK}"
     df[col_name] = confirmed_sents
     return df
 
 
+# === INCREMENTAL ENGINE ===
+class RollingStats:
+    """
+    Mean and sample std over the last `window` values (sliding Welford), O(1) per update.
+    Both are NaN until the window is full, like rolling(window, min_periods=window).
+    """
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, x):
+        if len(self.values) < self.window:
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.values.popleft()
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        # Sliding updates leave rounding dust in m2 when the window goes flat; sqrt would blow it up
+        if self.m2 < ROLLING_M2_DUST * self.window * self.mean * self.mean:
+            self.m2 = 0.0
+        if len(self.values) < self.window:
+            return float('nan'), float('nan')
+        return self.mean, math.sqrt(self.m2 / (self.window - 1)) if self.window > 1 else float('nan')
+
+
+class SymbolState:
+    def __init__(self, rolling_window):
+        self.offset = 0
+        self.expiry = None
+        self.ltp = RollingStats(rolling_window)
+        self.net_oi = RollingStats(rolling_window)
+        self.prev_net_oi_ma = float('nan')
+        self.prev_sentiment = None
+        self.count = 1
+
+
+class SentimentEngine:
+    """
+    Tails each symbol's snapshots from the last offset it has read and updates
+    the rolling stats, base sentiment and streak per new row, so each tick only
+    costs the rows appended since the previous one. New rows are appended to
+    the per-symbol and combined sentiment CSVs.
+
+    By default rows come from today's snapshot_store records (STORE_SYMBOLS).
+    Pass `files` ({symbol: text path}) to tail the pipe-delimited logs instead.
+    """
+    def __init__(self, files=None, rolling_window=ROLLING_WINDOW, dev_threshold=DEVIATION_THRESHOLD,
+                 streak=CONFIRMATION_STREAK, output_dir=None, store_symbols=None, store_dir=None):
+        self.files = files
+        self.store_symbols = store_symbols or STORE_SYMBOLS
+        self.store_dir = store_dir or snapshot_store.DATA_DIR
+        self.rolling_window = rolling_window
+        self.dev_threshold = dev_threshold
+        self.streak = streak
+        self.output_dir = output_dir or snapshot_store.DATA_DIR   # where the API reads them
+        self.col_name = f"Sentiment_SD{dev_threshold}_Streak{streak}"
+        self.columns = ['timestamp', 'symbol', 'expiry', 'ltp', 'net_oi_change', 'net_dex',
+                        'ltp_ma', 'net_oi_ma', 'ltp_std', 'net_oi_std', self.col_name]
+        self.states = {}
+        self._started_outputs = set()
+
+    def _read_new_lines(self, filepath, state):
+        if not os.path.exists(filepath):
+            return []
+        if os.path.getsize(filepath) < state.offset:
+            return None  # file was truncated or replaced
+        with open(filepath, 'rb') as f:
+            f.seek(state.offset)
+            chunk = f.read()
+        end = chunk.rfind(b'\n') + 1  # leave a partially written last line for the next tick
+        state.offset += end
+        return chunk[:end].decode('utf-8').splitlines()
+
+    def _update_row(self, state, row):
+        ltp_ma, ltp_std = state.ltp.push(row['ltp'])
+        net_oi_ma, net_oi_std = state.net_oi.push(row['net_oi_change'])
+        sentiment = classify(row['ltp'], ltp_ma, ltp_std, row['net_oi_change'], net_oi_ma, net_oi_std,
+                             state.prev_net_oi_ma, self.dev_threshold)
+        state.prev_net_oi_ma = net_oi_ma
+
+        if state.prev_sentiment is None:
+            confirmed = 'Not enough data'
+        else:
+            if sentiment == state.prev_sentiment and sentiment not in NON_SIGNALS:
+                state.count += 1
+            else:
+                state.count = 1
+            if state.count >= self.streak and sentiment not in NON_SIGNALS:
+                confirmed = sentiment
+            else:
+                confirmed = 'Sideways/Chop'
+        state.prev_sentiment = sentiment
+
+        row.update({'ltp_ma': ltp_ma, 'net_oi_ma': net_oi_ma, 'ltp_std': ltp_std, 'net_oi_std': net_oi_std,
+                    self.col_name: confirmed})
+        return row
+
+    def _read_new_records(self, store_symbol, date_str, state):
+        records = snapshot_store.read(store_symbol, date_str, offset=state.offset, data_dir=self.store_dir)
+        state.offset += len(records)
+        rows = []
+        for rec in records:
+            # Follow the first expiry seen, like the text parser follows the first EXP block
+            if state.expiry is None:
+                state.expiry = str(rec['expiry'])
+            if str(rec['expiry']) != state.expiry or np.isnan(rec['ltp']) or np.isnan(rec['net_oi_chg']):
+                continue
+            net_oi_change = int(rec['net_oi_chg'])
+            rows.append({
+                'timestamp': snapshot_store.format_ts(rec['ts']),
+                'expiry': state.expiry,
+                'ltp': float(rec['ltp']),
+                'net_oi_change': net_oi_change,
+                'net_dex': net_oi_change * 0.5
+            })
+        return rows
+
+    def _state(self, key):
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = SymbolState(self.rolling_window)
+        return state
+
+    def update_symbol(self, symbol, filepath):
+        state = self._state(filepath)
+        lines = self._read_new_lines(filepath, state)
+        if lines is None:
+            print(f"⚠️ {filepath} shrank, re-reading from the start")
+            state = self.states[filepath] = SymbolState(self.rolling_window)
+            self._started_outputs.discard(self._output_path(symbol))
+            lines = self._read_new_lines(filepath, state)
+
+        new_rows = []
+        for line in lines:
+            row = parse_line(line, symbol)
+            if row:
+                new_rows.append(self._update_row(state, row))
+            elif line.strip():
+                print(f"⚠️ Could not parse: {line.strip()}")
+        return new_rows
+
+    def update_store_symbol(self, symbol, store_symbol, date_str=None):
+        date_str = date_str or clock.now().strftime("%Y-%m-%d")
+        state = self._state(snapshot_store.store_path(store_symbol, date_str, self.store_dir))
+        new_rows = []
+        for row in self._read_new_records(store_symbol, date_str, state):
+            row['symbol'] = symbol
+            new_rows.append(self._update_row(state, row))
+        return new_rows
+
+    def _output_path(self, symbol):
+        return os.path.join(self.output_dir, sentiment_filename(symbol))
+
+    def _append(self, path, rows):
+        # The first write of a file in this process starts it over with a header
+        first = path not in self._started_outputs
+        pd.DataFrame(rows, columns=self.columns).to_csv(path, mode='w' if first else 'a', header=first, index=False)
+        self._started_outputs.add(path)
+
+    def update(self):
+        """
+        Process everything appended since the last call. Returns {symbol: [new rows]}.
+        """
+        new_by_symbol = {}
+        all_new = []
+        if self.files:
+            sources = [(symbol, self.update_symbol, filepath) for symbol, filepath in self.files.items()]
+        else:
+            sources = [(symbol, self.update_store_symbol, store_symbol)
+                       for symbol, store_symbol in self.store_symbols.items()]
+        for symbol, read_new, source in sources:
+            rows = read_new(symbol, source)
+            if rows:
+                output_path = self._output_path(symbol)
+                self._append(output_path, rows)
+                print(f"✅ {symbol}: {len(rows)} new sentiment rows appended to {output_path}")
+                new_by_symbol[symbol] = rows
+                all_new.extend(rows)
+
+        if all_new:
+            combined_path = os.path.join(self.output_dir, sentiment_filename('ALL'))
+            self._append(combined_path, all_new)
+        return new_by_symbol
+
+
+def to_chart_point(row, col_name=None):
+    """
+    Sentiment row -> the point shape /api/chartdata serves (HH:MM time, NaN as 0).
+    """
+    def num(value):
+        return 0.0 if value is None or pd.isna(value) else float(value)
+
+    point = {
+        'time': row['timestamp'][11:],
+        'ltp': num(row.get('ltp')),
+        'ltp_ma': num(row.get('ltp_ma')),
+        'net_oi_change': num(row.get('net_oi_change')),
+        'net_oi_ma': num(row.get('net_oi_ma')),
+        'net_dex': num(row.get('net_dex')),
+        'net_dex_ma': num(row.get('net_dex_ma')),
+    }
+    if col_name:
+        point['sentiment'] = row.get(col_name)
+    return point
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = SentimentEngine()
+    return _engine
+
+
 # === CALLABLE RUN FUNCTION ===
 def run_sentiment_analysis():
+    return get_engine().update()
+
+
+def run_full_sentiment_analysis():
+    """
+    Batch version: re-parses every file and rewrites all outputs from scratch.
+    """
     all_dfs = []
     for symbol, filepath in FILES.items():
         df = process_symbol(symbol, filepath)
         if not df.empty:
             # Save per-symbol sentiment
-            output_path = f'backend/data/sentiments_{symbol}_{pd.Timestamp.now().strftime("%d%b")}.csv'
+            output_path = os.path.join('backend/data', sentiment_filename(symbol))
             df.to_csv(output_path, index=False)
             print(f"✅ {symbol} sentiments saved to {output_path}")
             all_dfs.append(df)
@@ -150,7 +484,7 @@ def run_sentiment_analysis():
     # Save combined file for all symbols
     if all_dfs:
         combined_df = pd.concat(all_dfs, ignore_index=True)
-        combined_path = f'backend/data/sentiments_ALL_{pd.Timestamp.now().strftime("%d%b")}.csv'
+        combined_path = os.path.join('backend/data', sentiment_filename('ALL'))
         combined_df.to_csv(combined_path, index=False)
         print(f"📂 Combined sentiments saved to {combined_path}")
     else:
@@ -160,4 +494,13 @@ def run_sentiment_analysis():
 
 # === OLD STANDALONE MAIN (still works if run alone) ===
 if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--verify":
+        # python OIBasedSentiments.py --verify 260105_minute_2025-09-01_2025-09-09.csv ...
+        failed = False
+        for path in sys.argv[2:]:
+            df = add_moving_averages(load_ohlc_as_snapshots(path))
+            mismatches = verify_vectorized(df)
+            print(f"{'✅' if not mismatches else '❌'} {path}: {len(df)} rows, {len(mismatches)} mismatches")
+            failed = failed or bool(mismatches)
+        sys.exit(1 if failed else 0)
     run_sentiment_analysis()
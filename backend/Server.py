@@ -1,58 +1,229 @@
 # backend/server.py
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, g, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
+import gzip
+import hashlib
+import argparse
 import datetime
-import csv
+import json
+import time
+import queue
+import threading
+from collections import OrderedDict
+import live_bus
+import clock
+import metrics
+import snapshot_store
+import ohlc_resampler
+import OIBasedSentiments
+from api_cache import CsvTail, StoreTail, JsonResponseCache, FileCache
 
 app = Flask(__name__)
 CORS(app)
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-date_str = datetime.now().strftime("%Y-%m-%d")
-SNAPSHOT_FILES = {
-    "NIFTY": f"snapshots_NIFTY_{date_str}.txt",
-    "BANKNIFTY": f"snapshots_BANKNIFTY_{date_str}.txt",
-    "SENSEX": f"snapshots_SENSEX_{date_str}.txt"
-}
+DATA_DIR = snapshot_store.DATA_DIR
+SNAPSHOT_SYMBOLS = ["NIFTY", "BANKNIFTY", "SENSEX"]
+STREAM_HEARTBEAT_SECONDS = 15
 
-# Map index name to today's CSV filename
+# === PRODUCTION SERVING ===
+PROD_THREADS = 32            # threads for regular API requests
+MAX_STREAM_CLIENTS = 16      # open /api/stream clients; each holds a thread of its own on top of PROD_THREADS
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+COMPRESSED_CACHE_SIZE = 64   # compressed bodies kept per (ETag, encoding)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Map index name to today's sentiment CSV (named by OIBasedSentiments)
+def csv_files():
+    return {
+        index_name: OIBasedSentiments.sentiment_filename(name)
+        for name, index_name in OIBasedSentiments.STORE_SYMBOLS.items()
+    }
+
+# A stream holds its server thread for the whole connection, so streams get
+# their own budget instead of eating into the threads the API needs
+stream_slots = threading.BoundedSemaphore(MAX_STREAM_CLIENTS)
+
+snapshot_cache = JsonResponseCache()
+chart_cache = JsonResponseCache()
+levels_cache = FileCache()
+
+
+def serve_cache(cache, key, make_tails):
+    """
+    Full body, or only the new points when the request carries ?since=<cursor>.
+    """
+    if "since" in request.args:
+        return cached_json(*cache.delta(key, make_tails, request.args.get("since", "")))
+    return cached_json(*cache.get(key, make_tails))
+
+
+def cached_json(body, etag):
+    """
+    Serve a prebuilt JSON body, or 304 when the client already has this ETag.
+    """
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+compressed_cache = OrderedDict()
+compressed_lock = threading.Lock()
+
+
+def compress_body(data, encoding, etag=None):
+    """
+    gzip/brotli bytes for a response body; bodies with an ETag are compressed once.
+    """
+    key = (etag, encoding)
+    if etag:
+        with compressed_lock:
+            if key in compressed_cache:
+                compressed_cache.move_to_end(key)
+                return compressed_cache[key]
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=5)
+    else:
+        compressed = gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    if etag:
+        with compressed_lock:
+            compressed_cache[key] = compressed
+            while len(compressed_cache) > COMPRESSED_CACHE_SIZE:
+                compressed_cache.popitem(last=False)
+    return compressed
+
+
+# === TELEMETRY ===
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+# Registered before compress_response, so it runs after it and counts the bytes actually sent
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("api_request_seconds", time.perf_counter() - g.get("request_start", time.perf_counter()),
+                    endpoint=endpoint)
+    metrics.inc("api_requests_total", endpoint=endpoint, status=response.status_code)
+    if not response.is_streamed:
+        metrics.inc("api_response_bytes_total", response.content_length or 0, endpoint=endpoint)
+    return response
+
+
+@app.route("/metrics")
+def get_metrics():
+    """
+    Prometheus-text metrics for the API process (the collector serves its own on metrics.COLLECTOR_PORT).
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"):
+        return response
+    accepted = request.accept_encodings
+    encoding = "br" if brotli is not None and accepted["br"] else "gzip" if accepted["gzip"] else None
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+    etag, _ = response.get_etag()
+    response.set_data(compress_body(data, encoding, etag))
+    response.headers["Content-Encoding"] = encoding
+    return response
 
 
-CSV_FILES = {
-      "BANKNIFTY": f"Sentiments_BANKNIFTY_{datetime.datetime.now().strftime('%d%b')}.csv",
-      "NIFTY": f"Sentiments_NIFTY_{datetime.datetime.now().strftime('%d%b')}.csv",
-      "SENSEX": f"Sentiments_SENSEX_{datetime.datetime.now().strftime('%d%b')}.csv"
-}
 @app.route("/api/snapshots")
 def get_snapshots():
     """
-    Return all snapshots from individual text files.
+    Return today's snapshot records per index from the snapshot store.
+    Only records appended since the previous request are converted.
+    With ?since=<cursor> only records after the cursor are returned.
+    """
+    date_str = clock.now().strftime("%Y-%m-%d")
+    return serve_cache(snapshot_cache, date_str, lambda: {
+        index_name: StoreTail(index_name, date_str, DATA_DIR) for index_name in SNAPSHOT_SYMBOLS
+    })
+
+@app.route("/api/stream")
+def stream():
     """
-    all_snapshots = {}
-    for index_name, filename in SNAPSHOT_FILES.items():
-        file_path = os.path.join(DATA_DIR, filename)
-        snapshots = []
+    Server-Sent Events: snapshot, chart and levels events pushed by the
+    collector as soon as they are computed.
+    """
+    try:
+        live_bus.start_listener()
+    except OSError as e:
+        return Response(f"Live bus unavailable: {e}", status=503)
+    slots = stream_slots
+    if not slots.acquire(blocking=False):
+        # The dashboard keeps polling every 30s without the stream
+        return Response("Too many live streams", status=503, headers={"Retry-After": "30"})
+
+    def events():
+        q = live_bus.subscribe()
+        metrics.inc("api_stream_clients")
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = q.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                event = json.loads(message)
+                yield f"event: {event['topic']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            metrics.inc("api_stream_clients", -1)
+            live_bus.unsubscribe(q)
 
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        snapshots.append(line)
-        else:
-            print(f"Data file not found: {file_path}")
+    released = threading.Event()
 
-        all_snapshots[index_name] = snapshots
+    def release_slot():
+        # Runs when the server closes the response, even if the generator never started
+        if not released.is_set():
+            released.set()
+            slots.release()
 
-    return jsonify(all_snapshots)
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.call_on_close(release_slot)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 @app.route("/api/levels/<filename>")
 def get_levels(filename):
     """
-    Serve levels JSON files directly, e.g. levels_NIFTY_50.json, levels_BANKNIFTY.json, levels_SENSEX.json
+    Levels JSON (e.g. levels_NIFTY_50.json, levels_NIFTY_BANK.json, levels_SENSEX.json)
+    served from memory; the file is only re-read after the collector replaces it.
     """
-    return send_from_directory(DATA_DIR, filename)
+    if not filename.startswith("levels_") or not filename.endswith(".json") or "/" in filename or "\\" in filename:
+        return Response("Not found", status=404)
+    body, etag = levels_cache.get(os.path.join(DATA_DIR, filename))
+    if body is None:
+        return Response("Not found", status=404)
+    return cached_json(body, etag)
+
+@app.route("/api/levels/refresh", methods=["POST"])
+def refresh_levels():
+    """
+    Ask the collector to recompute levels now; results arrive as a levels event.
+    """
+    if not live_bus.send_command("refresh_levels"):
+        return Response("Collector unreachable", status=503)
+    return Response(status=202)
 
 @app.route("/api/ohlc/<filename>")
 def get_ohlc(filename):
@@ -61,6 +232,24 @@ def get_ohlc(filename):
     print("Looking for file:", full_path)
     return send_from_directory(ohlc_folder, filename)
 
+@app.route("/api/ohlc/<symbol>/<timeframe>")
+def get_ohlc_timeframe(symbol, timeframe):
+    """
+    Candles for any timeframe (1m/3m/5m/15m/30m/1h/day) resampled from the
+    stored 1-minute bars. Optional ?start=YYYY-mm-dd[ HH:MM]&end=...
+    """
+    if timeframe not in ohlc_resampler.TIMEFRAMES:
+        return Response(f"Unknown timeframe {timeframe}", status=400)
+    try:
+        start = ohlc_resampler.parse_minute(request.args.get("start"))
+        end = ohlc_resampler.parse_minute(request.args.get("end"), end=True)
+    except ValueError:
+        return Response("Bad start/end", status=400)
+    bars = ohlc_resampler.get_engine().get(symbol, timeframe, start, end)
+    body = json.dumps(ohlc_resampler.to_dicts(bars))
+    etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    return cached_json(body, etag)
+
 def safe_float(value, default=0.0):
     try:
         if value is None or value.strip() == "":
@@ -69,44 +258,68 @@ def safe_float(value, default=0.0):
     except ValueError:
         return default
 
+def chart_point(row):
+    ts_str = row.get("timestamp") or row.get("time") or ""
+    if len(ts_str) == 16 and ts_str[2] == "-" and ts_str[13] == ":":
+        time_fmt = ts_str[11:]  # "dd-mm-YYYY HH:MM" -> "HH:MM"
+    else:
+        try:
+            dt = datetime.datetime.strptime(ts_str, "%d-%m-%Y %H:%M")
+            time_fmt = dt.strftime("%H:%M")
+        except Exception:
+            time_fmt = ts_str
+
+    return {
+        "time": time_fmt,
+        "ltp": safe_float(row.get("ltp")),
+        "ltp_ma": safe_float(row.get("ltp_ma")),
+        "net_oi_change": safe_float(row.get("net_oi_change")),
+        "net_oi_ma": safe_float(row.get("net_oi_ma")),
+        "net_dex": safe_float(row.get("net_dex")),
+        "net_dex_ma": safe_float(row.get("net_dex_ma"))
+    }
+
+
 @app.route("/api/chartdata")
 def get_chartdata():
-    chart_data = {}
-
-    for index_name, filename in CSV_FILES.items():
-        file_path = os.path.join(DATA_DIR, filename)
-        data_points = []
-
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    ts_str = row.get("timestamp") or row.get("time")
-                    try:
-                        # If your CSV time has a date
-                        dt = datetime.datetime.strptime(ts_str, "%d-%m-%Y %H:%M")
-                        time_fmt = dt.strftime("%H:%M")
-                    except Exception:
-                        time_fmt = ts_str
-
-                    data_points.append({
-                        "time": time_fmt,
-                        "ltp": safe_float(row.get("ltp")),
-                        "ltp_ma": safe_float(row.get("ltp_ma")),
-                        "net_oi_change": safe_float(row.get("net_oi_change")),
-                        "net_oi_ma": safe_float(row.get("net_oi_ma")),
-                        "net_dex": safe_float(row.get("net_dex")),
-                        "net_dex_ma": safe_float(row.get("net_dex_ma"))                        
-                    })
-
-            data_points.sort(key=lambda x: x["time"])
-        else:
-            print(f"CSV file not found: {file_path}")
-
-        chart_data[index_name] = data_points
-
-    return jsonify(chart_data)
+    """
+    Chart series per index from today's sentiment CSVs, parsed incrementally.
+    With ?since=<cursor> only points after the cursor are returned.
+    """
+    files = csv_files()
+    return serve_cache(chart_cache, tuple(files.values()), lambda: {
+        index_name: CsvTail(os.path.join(DATA_DIR, filename), chart_point, sort_key=lambda x: x["time"])
+        for index_name, filename in files.items()
+    })
+
+
+def serve_production(host, port, threads=PROD_THREADS, streams=MAX_STREAM_CLIENTS):
+    """
+    Multi-threaded waitress server with `threads` for the API plus one per
+    allowed stream; falls back to threaded Werkzeug without reloader/debugger.
+    """
+    global stream_slots
+    stream_slots = threading.BoundedSemaphore(streams)
+    try:
+        from waitress import serve
+    except ImportError:
+        print("⚠️ waitress not installed (pip install waitress), using threaded Werkzeug server")
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+    print(f"🚀 Serving on http://{host}:{port} with {threads} API threads + {streams} stream threads")
+    serve(app, host=host, port=port, threads=threads + streams, channel_timeout=STREAM_HEARTBEAT_SECONDS * 4)
 
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="Dashboard API server")
+    parser.add_argument("--prod", action="store_true", help="production mode (waitress, no debugger)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=PROD_THREADS)
+    parser.add_argument("--streams", type=int, default=MAX_STREAM_CLIENTS, help="max open /api/stream clients")
+    args = parser.parse_args()
+
+    if args.prod:
+        serve_production(args.host, args.port, args.threads, args.streams)
+    else:
+        app.run(host=args.host, port=args.port, debug=True)
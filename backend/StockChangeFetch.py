@@ -1,95 +1,146 @@
 
 # fetch_index_prices.py
-def fetch_and_save_index_prices(cookie_string):
-    import requests
-    import urllib3
-    import os
-    from datetime import datetime
-    import logging
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import urllib3
+import http_pool
+import payload_capture
+import file_writer
+import live_bus
+import clock
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+# === SETTINGS ===
+QUOTES_URL = "https://oxide.sensibull.com/v1/compute/cache/quotes_v2"
+# Constituents x indices; weights are in % of each index and are normalised per
+# column, so they only need updating when an index rebalances.
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index_weights.csv")
+INDICES = ["NIFTY", "BANKNIFTY", "SENSEX"]
+QUOTE_CHUNK_SIZE = 30   # trading symbols per quotes_v2 request
+TOP_MOVERS = 3
+
+_chunk_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quotes")
+_weights = {"mtime": None}
+
+
+def load_weights(path=WEIGHTS_FILE):
+    """
+    (symbols, weights) with weights an (n_stocks, n_indices) matrix whose
+    columns sum to 1. Re-read only when the file changes.
+    """
+    mtime = os.path.getmtime(path)
+    if _weights["mtime"] != mtime:
+        df = pd.read_csv(path)
+        matrix = df[INDICES].to_numpy(dtype=np.float64)
+        totals = matrix.sum(axis=0)
+        _weights.update(mtime=mtime, symbols=df["symbol"].tolist(),
+                        matrix=np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0))
+    return _weights["symbols"], _weights["matrix"]
+
+
+def fetch_quotes(symbols, cookies):
+    """
+    price_change per symbol from quotes_v2, requested in parallel chunks.
+    """
+    def fetch_chunk(chunk):
+        response = http_pool.post(QUOTES_URL, json={"trading_symbols": chunk}, cookies=cookies, timeout=10, verify=False)
+        response.raise_for_status()
+        raw = response.json()
+        payload_capture.capture("quotes_v2", "stocks", raw)
+        return raw.get("payload", {})
+
+    chunks = [symbols[i:i + QUOTE_CHUNK_SIZE] for i in range(0, len(symbols), QUOTE_CHUNK_SIZE)]
+    payload = {}
+    for future in [_chunk_pool.submit(fetch_chunk, chunk) for chunk in chunks]:
+        try:
+            payload.update(future.result())
+        except Exception as e:
+            logging.error(f"❌ quotes_v2 chunk failed: {e}")
+    return payload
+
+
+def price_changes(symbols, payload):
+    """
+    % change vector aligned with symbols; NaN where no quote came back.
+    """
+    changes = np.full(len(symbols), np.nan)
+    for i, symbol in enumerate(symbols):
+        try:
+            changes[i] = float(payload[symbol]["price_change"]) * 100
+        except (KeyError, TypeError, ValueError):
+            pass
+    return changes
+
+
+def index_proxy(symbols, weights, changes):
+    """
+    Weighted % change, coverage and breadth for every index from one matrix
+    product: [changes, quoted, advancing, declining] x weights / members.
+    """
+    quoted = ~np.isnan(changes)
+    pct = np.where(quoted, changes, 0.0)
+    members = (weights > 0).astype(np.float64)
+    columns = np.column_stack([pct, quoted, quoted & (pct > 0), quoted & (pct < 0)]).astype(np.float64)
+    weighted = columns.T @ np.hstack([weights, members])      # (4, 2 * n_indices)
+    n = len(INDICES)
+
+    contributions = weights * pct[:, None]                     # per-stock share of each index move
+    result = {}
+    for j, index in enumerate(INDICES):
+        coverage = weighted[1, j]
+        order = np.argsort(contributions[:, j])
+        in_index = weights[:, j] > 0
+        gainers = [symbols[i] for i in order[::-1] if in_index[i] and contributions[i, j] > 0][:TOP_MOVERS]
+        losers = [symbols[i] for i in order if in_index[i] and contributions[i, j] < 0][:TOP_MOVERS]
+        result[index] = {
+            "change": weighted[0, j] / coverage if coverage else None,
+            "coverage": coverage,
+            "advancers": int(weighted[2, n + j]),
+            "decliners": int(weighted[3, n + j]),
+            "members": int(members[:, j].sum()),
+            "top_gainers": gainers,
+            "top_losers": losers,
+        }
+    return result
+
+
+def format_change(value):
+    return f"{value:+6.2f}%" if value is not None else "  N/A "
 
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-    url = f"https://oxide.sensibull.com/v1/compute/cache/quotes_v2"
+def fetch_and_save_index_prices(cookie_string):
     cookies = dict(x.strip().split("=", 1) for x in cookie_string.split("; "))
 
-
-    # List of stock symbols to fetch
-    symbols = [
-        "RELIANCE", "HDFCBANK", "ICICIBANK", "SBIN", "AXISBANK",
-        "KOTAKBANK", "TCS", "INFY", "BHARTIARTL", "LT", "ITC", 
-        "HINDUNILVR", "BAJFINANCE"
-    ]
-
-    # Example weights (replace with real weights)
-    nifty_weights = {
-        "RELIANCE": 9, "HDFCBANK": 13, "ICICIBANK": 9, "SBIN": 2, 
-        "AXISBANK": 3, "KOTAKBANK": 3, "TCS": 3, "INFY": 4,
-        "BHARTIARTL": 5, "LT": 3.5, "ITC": 3
-    }
-    banknifty_weights = {
-     "HDFCBANK": 28, "ICICIBANK": 25, "SBIN": 9, 
-        "AXISBANK": 8, "KOTAKBANK": 8
-    }
-
-    sensex_weights = {
-        "RELIANCE": 12, "HDFCBANK": 10, "BHARTIARTL": 8, "TCS": 8, "ICICIBANK": 7, "SBIN": 4, 
-        "BAJFINANCE": 3, "INFY": 4, "ITC": 3
-    }
-
     output_dir = "data"
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, "stocks_price_change_table.txt")
+    output_file = os.path.join(output_dir, "index_breadth_table.txt")
 
-    header = "| {:<19} | {:>9} | {:>9} | {:>9} |".format("Timestamp", "NIFTY", "BANKNIFTY", "SENSEX") + "".join(
-        f" {symbol:>10} |" for symbol in symbols
+    header = "| {:<16} |".format("Timestamp") + "".join(
+        f" {index:>9} | {index + ' A/D':>14} | {index + ' movers':<40} |" for index in INDICES
     )
 
-    if not os.path.exists(output_file):
-        with open(output_file, "w") as f:
-            f.write(header + "\n")
-
     try:
-        payload = {"trading_symbols": symbols}
-        response = requests.post(url, json=payload, cookies=cookies, timeout=10, verify=False)
-        response.raise_for_status()
-        payload_data = response.json().get("payload", {})
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-        nifty_total = banknifty_total = sensex_total = 0
-        stock_changes = []
-
-        for symbol in symbols:
-            price_change = payload_data.get(symbol, {}).get("price_change")
-            if price_change is not None:
-                try:
-                    pct = float(price_change) * 100
-                    price_str = f"{pct:+.2f}%"
-                    nifty_total += pct * nifty_weights.get(symbol, 0)
-                    banknifty_total += pct * banknifty_weights.get(symbol, 0)
-                    sensex_total += pct * sensex_weights.get(symbol, 0)
-                except:
-                    price_str = "   N/A"
-            else:
-                price_str = "   N/A"
-            stock_changes.append(f"{price_str:>10}")
-
-        def calc_index(total, weights):
-            w_sum = sum(weights.values())
-            return f"{(total/w_sum):+6.2f}%" if w_sum else "  N/A "
-
-        nifty_str = calc_index(nifty_total, nifty_weights)
-        banknifty_str = calc_index(banknifty_total, banknifty_weights)
-        sensex_str = calc_index(sensex_total, sensex_weights)
-
-        row = f"| {timestamp:<19} | {nifty_str:>9} | {banknifty_str:>9} | {sensex_str:>9} |"
-        for change in stock_changes:
-            row += f" {change} |"
-
-        with open(output_file, "a") as f:
-            f.write(row + "\n")
+        symbols, weights = load_weights()
+        changes = price_changes(symbols, fetch_quotes(symbols, cookies))
+        proxy = index_proxy(symbols, weights, changes)
+
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M")
+        row = f"| {timestamp:<16} |"
+        for index in INDICES:
+            p = proxy[index]
+            movers = " ".join([f"+{s}" for s in p["top_gainers"]] + [f"-{s}" for s in p["top_losers"]])
+            row += f" {format_change(p['change']):>9} | {str(p['advancers']) + '/' + str(p['decliners']):>14} | {movers:<40} |"
+
+        file_writer.get_writer().write_line(output_file, row, header=header)
+        live_bus.publish("breadth", {"timestamp": timestamp, **proxy})
 
         print("\n📊 Latest index/stock row added:")
         print(row)
+        return proxy
 
     except Exception as e:
         logging.error(f"❌ Error fetching index prices: {e}")
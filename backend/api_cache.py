@@ -0,0 +1,211 @@
+import os
+import csv
+import json
+import hashlib
+import threading
+import snapshot_store
+
+
+class CsvTail:
+    """
+    Incrementally parsed view of an append-only CSV. Each refresh() parses only
+    the complete lines written since the last one; a file that was truncated or
+    rewritten is parsed again from the start.
+    """
+    def __init__(self, path, parse_row, sort_key=None):
+        self.path = path
+        self.parse_row = parse_row
+        self.sort_key = sort_key
+        self._reset()
+
+    def _reset(self):
+        self.generation = getattr(self, "generation", -1) + 1  # bumped whenever earlier items change
+        self.offset = 0
+        self.header = None
+        self.items = []
+        self.fragments = []   # json.dumps of each item, joined into responses
+        self.version = None
+
+    def _rewritten(self, f, size):
+        if size < self.offset:
+            return True
+        if self.offset == 0:
+            return False
+        f.seek(self.offset - 1)
+        return f.read(1) != b"\n"
+
+    def refresh(self):
+        """
+        Returns True when the parsed items changed.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self.version is None:
+                return False
+            self._reset()
+            return True
+        version = (st.st_size, st.st_mtime_ns)
+        if version == self.version:
+            return False
+
+        with open(self.path, "rb") as f:
+            if self._rewritten(f, st.st_size):
+                self._reset()
+            f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+        end = chunk.rfind(b"\n") + 1
+        self.offset += end
+        self.version = version
+
+        lines = chunk[:end].decode("utf-8").splitlines()
+        new_items = []
+        for values in csv.reader(lines):
+            if not values:
+                continue
+            if self.header is None:
+                self.header = values
+                continue
+            new_items.append(self.parse_row(dict(zip(self.header, values))))
+        if not new_items:
+            return end > 0
+
+        needs_sort = self.sort_key is not None and (
+            (self.items and self.sort_key(new_items[0]) < self.sort_key(self.items[-1])) or
+            any(self.sort_key(a) > self.sort_key(b) for a, b in zip(new_items, new_items[1:]))
+        )
+        self.items.extend(new_items)
+        self.fragments.extend(json.dumps(item) for item in new_items)
+        if needs_sort:
+            pairs = sorted(zip(self.items, self.fragments), key=lambda p: self.sort_key(p[0]))
+            self.items = [p[0] for p in pairs]
+            self.fragments = [p[1] for p in pairs]
+            self.generation += 1
+        return True
+
+
+class StoreTail:
+    """
+    Incrementally converted view of one symbol's snapshot_store records for a day.
+    """
+    def __init__(self, symbol, date_str, data_dir=snapshot_store.DATA_DIR):
+        self.symbol = symbol
+        self.date_str = date_str
+        self.data_dir = data_dir
+        self.path = snapshot_store.store_path(symbol, date_str, data_dir)
+        self.offset = 0
+        self.items = []
+        self.fragments = []
+        self.version = None
+        self.generation = 0
+
+    def refresh(self):
+        try:
+            count = os.path.getsize(self.path) // snapshot_store.SNAPSHOT_DTYPE.itemsize
+        except OSError:
+            count = 0
+        if count == self.offset:
+            return False
+        if count < self.offset:
+            self.offset, self.items, self.fragments = 0, [], []
+            self.generation += 1
+        records = snapshot_store.read(self.symbol, self.date_str, offset=self.offset, data_dir=self.data_dir)
+        new_items = snapshot_store.to_dicts(records)
+        self.offset += len(records)
+        self.version = self.offset
+        self.items.extend(new_items)
+        self.fragments.extend(json.dumps(item) for item in new_items)
+        return True
+
+
+class JsonResponseCache:
+    """
+    Prebuilt JSON body ({name: [items]}) and ETag for a set of tails, rebuilt
+    only when one of them reports new data. delta() serves only the items
+    after a client's cursor.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tails = {}
+        self.key = None
+        self.body = None
+        self.etag = None
+        self.generation = None
+
+    def _refresh(self, key, make_tails):
+        if key != self.key:
+            self.key = key
+            self.tails = make_tails()
+            self.body = None
+        changed = False
+        for tail in self.tails.values():
+            changed = tail.refresh() or changed
+        if changed or self.body is None:
+            self.body = "{" + ",".join(
+                f"{json.dumps(name)}:[{','.join(tail.fragments)}]" for name, tail in self.tails.items()
+            ) + "}"
+            state = repr((key, [(name, tail.version) for name, tail in self.tails.items()]))
+            self.etag = hashlib.sha1(state.encode("utf-8")).hexdigest()
+            generations = repr((key, [tail.generation for tail in self.tails.values()]))
+            self.generation = hashlib.sha1(generations.encode("utf-8")).hexdigest()[:8]
+
+    def get(self, key, make_tails):
+        """
+        key identifies the tail set (e.g. today's date); make_tails() builds a
+        fresh {name: tail} dict when the key changes. Returns (body, etag).
+        """
+        with self.lock:
+            self._refresh(key, make_tails)
+            return self.body, self.etag
+
+    def delta(self, key, make_tails, since):
+        """
+        Items appended after the cursor `since` (from a previous delta
+        response) as {"cursor", "reset", "data": {name: [items]}}. An empty
+        or stale cursor (new day, rewritten file) gets everything with
+        reset=true. Returns (body, etag).
+        """
+        with self.lock:
+            self._refresh(key, make_tails)
+            counts = [len(tail.fragments) for tail in self.tails.values()]
+            cursor = "-".join([self.generation] + [str(n) for n in counts])
+
+            parts = since.split("-") if since else []
+            starts = [int(p) for p in parts[1:] if p.isdigit()]
+            reset = (len(parts) != len(counts) + 1 or parts[0] != self.generation or len(starts) != len(counts)
+                     or any(start > n for start, n in zip(starts, counts)))
+            if reset:
+                starts = [0] * len(counts)
+
+            data = ",".join(
+                f"{json.dumps(name)}:[{','.join(tail.fragments[start:])}]"
+                for (name, tail), start in zip(self.tails.items(), starts)
+            )
+            body = f'{{"cursor":{json.dumps(cursor)},"reset":{json.dumps(reset)},"data":{{{data}}}}}'
+            etag = hashlib.sha1(f"{self.etag}|{since}".encode("utf-8")).hexdigest()
+            return body, etag
+
+
+class FileCache:
+    """
+    File bodies kept in memory and re-read only when the file's size or
+    mtime changes (atomic replaces included). get() returns (body, etag),
+    or (None, None) when the file does not exist.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, None
+        version = (st.st_size, st.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != version:
+                with open(path, "rb") as f:
+                    body = f.read()
+                entry = self.entries[path] = (version, body, hashlib.sha1(body).hexdigest())
+            return entry[1], entry[2]
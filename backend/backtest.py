@@ -0,0 +1,229 @@
+import os
+import re
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import snapshot_store
+from OIBasedSentiments import (
+    apply_sentiment_rules_vectorized, confirm_signals_vectorized, load_ohlc_as_snapshots,
+)
+
+# === DEFAULT GRID ===
+WINDOWS = list(range(5, 31, 2))
+THRESHOLDS = [round(0.1 * i, 1) for i in range(1, 11)]
+STREAKS = [1, 2, 3, 4]
+HORIZONS = [1, 5, 15]   # forward return horizons, in bars (minutes for stored snapshots)
+SYMBOLS = ["NIFTY", "BANKNIFTY", "SENSEX"]
+OUTPUT_DIR = os.path.join(snapshot_store.DATA_DIR, "backtests")
+
+# Which way each label calls the market; 0 = no call (no hit rate)
+LABEL_DIRECTION = {
+    'Strong Bullish': 1,
+    'Weak Bullish / Caution': 1,
+    'Strong Bearish': -1,
+    'Weak Bearish / Caution': -1,
+    'Neutral': 0,
+    'Sideways/Chop': 0,
+    'Not enough data': 0,
+}
+
+
+# === INPUT ===
+def load_store_segments(symbols=SYMBOLS, start=None, end=None, data_dir=snapshot_store.DATA_DIR):
+    """
+    One segment per symbol and day of stored snapshots, following the day's
+    first expiry like the live SentimentEngine. Returns [(symbol, date, ltp, net_oi)].
+    """
+    segments = []
+    for symbol in symbols:
+        pattern = re.compile(rf"snapshots_{symbol}_(\d{{4}}-\d{{2}}-\d{{2}})\.rec$")
+        for path in sorted(glob.glob(os.path.join(data_dir, f"snapshots_{symbol}_*.rec"))):
+            match = pattern.search(os.path.basename(path))
+            if not match:
+                continue
+            date_str = match.group(1)
+            if (start and date_str < start) or (end and date_str > end):
+                continue
+            records = snapshot_store.read(symbol, date_str, data_dir=data_dir)
+            if len(records) == 0:
+                continue
+            keep = ((records['expiry'] == records['expiry'][0]) &
+                    ~np.isnan(records['ltp']) & ~np.isnan(records['net_oi_chg']))
+            records = records[keep]
+            segments.append((symbol, date_str, records['ltp'].astype(np.float64),
+                             np.trunc(records['net_oi_chg']).astype(np.float64)))
+    return segments
+
+
+def load_csv_segments(paths):
+    """
+    Bundled OHLC CSVs as stand-in snapshots (see load_ohlc_as_snapshots), one segment per day.
+    """
+    segments = []
+    for path in paths:
+        symbol = os.path.basename(path).split('_')[0]
+        df = load_ohlc_as_snapshots(path)
+        for date_str, day in df.groupby(df['timestamp'].str[:10], sort=True):
+            segments.append((symbol, date_str, day['ltp'].to_numpy(dtype=np.float64),
+                             day['net_oi_change'].to_numpy(dtype=np.float64)))
+    return segments
+
+
+def pack_segments(segments):
+    """
+    Concatenate segments into one (4, n) float64 block: ltp, net_oi, segment id, symbol id.
+    """
+    symbols = sorted({s[0] for s in segments})
+    n = sum(len(s[2]) for s in segments)
+    block = np.empty((4, n), dtype=np.float64)
+    pos = 0
+    for seg_id, (symbol, _, ltp, net_oi) in enumerate(segments):
+        block[0, pos:pos + len(ltp)] = ltp
+        block[1, pos:pos + len(ltp)] = net_oi
+        block[2, pos:pos + len(ltp)] = seg_id
+        block[3, pos:pos + len(ltp)] = symbols.index(symbol)
+        pos += len(ltp)
+    return block, symbols
+
+
+# === WORKER ===
+_shared = {}
+
+
+def _attach(shm_name, shape, symbols, horizons):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    seg = block[2].astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+    forward = {}
+    for h in horizons:
+        ahead = np.full(len(seg), np.nan)
+        if h < len(seg):
+            same_day = seg[h:] == seg[:-h]
+            ahead[:-h] = np.where(same_day, block[0, h:] / block[0, :-h] - 1, np.nan)
+        forward[h] = ahead * 10000   # basis points
+    _shared.update(shm=shm, block=block, seg=seg, starts=starts, symbol_ids=block[3].astype(np.int64),
+                   symbols=symbols, forward=forward)
+
+
+def _rolling(values, seg, window):
+    grouped = pd.Series(values).groupby(seg, sort=False).rolling(window, min_periods=window)
+    return grouped.mean().to_numpy(), grouped.std().to_numpy()
+
+
+def _label_stats(labels, params):
+    rows = []
+    symbol_ids = _shared['symbol_ids']
+    groups = [('ALL', None)] + [(name, symbol_ids == i) for i, name in enumerate(_shared['symbols'])]
+    for label, direction in LABEL_DIRECTION.items():
+        is_label = labels == label
+        if not is_label.any():
+            continue
+        for group, in_group in groups:
+            mask = is_label if in_group is None else is_label & in_group
+            count = int(mask.sum())
+            if not count:
+                continue
+            for h, ahead in _shared['forward'].items():
+                fwd = ahead[mask]
+                fwd = fwd[~np.isnan(fwd)]
+                rows.append({
+                    **params, 'symbol': group, 'label': label, 'horizon': h, 'count': count,
+                    'hit_rate': float(np.mean(np.sign(fwd) == direction)) if direction and len(fwd) else np.nan,
+                    'mean_bps': float(fwd.mean()) if len(fwd) else np.nan,
+                    'median_bps': float(np.median(fwd)) if len(fwd) else np.nan,
+                    'std_bps': float(fwd.std()) if len(fwd) > 1 else np.nan,
+                })
+    return rows
+
+
+def run_window(window, thresholds, streaks):
+    """
+    All threshold x streak combinations for one rolling window: the rolling
+    stats are computed once and shared by every combination.
+    """
+    block, seg, starts = _shared['block'], _shared['seg'], _shared['starts']
+    ltp_ma, ltp_std = _rolling(block[0], seg, window)
+    net_oi_ma, net_oi_std = _rolling(block[1], seg, window)
+    df = pd.DataFrame({'ltp': block[0], 'ltp_ma': ltp_ma, 'ltp_std': ltp_std, 'net_oi_change': block[1],
+                       'net_oi_ma': net_oi_ma, 'net_oi_std': net_oi_std})
+    rows = []
+    for threshold in thresholds:
+        base = apply_sentiment_rules_vectorized(df, threshold)
+        for streak in streaks:
+            confirmed = np.asarray(confirm_signals_vectorized(base, streak), dtype=object)
+            confirmed[starts] = 'Not enough data'   # runs never carry over from the previous day
+            rows.extend(_label_stats(confirmed, {'window': window, 'threshold': threshold, 'streak': streak}))
+    return rows
+
+
+# === SWEEP ===
+def run_sweep(segments, windows=WINDOWS, thresholds=THRESHOLDS, streaks=STREAKS, horizons=HORIZONS, workers=None):
+    """
+    Sweep the grid over the segments on a process pool. The input arrays live
+    in shared memory, so each worker maps them instead of receiving a copy.
+    Returns a DataFrame with one row per parameter set, symbol, label and horizon.
+    """
+    block, symbols = pack_segments(segments)
+    shm = shared_memory.SharedMemory(create=True, size=block.nbytes)
+    try:
+        np.ndarray(block.shape, dtype=block.dtype, buffer=shm.buf)[:] = block
+        init_args = (shm.name, block.shape, symbols, horizons)
+        rows = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=init_args) as pool:
+            futures = [pool.submit(run_window, w, thresholds, streaks) for w in windows]
+            for future in futures:
+                rows.extend(future.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    return pd.DataFrame(rows)
+
+
+def summarize(results, horizon, min_count=20, top=10):
+    """
+    Best parameter sets by directional hit rate across all symbols at one horizon.
+    """
+    directional = results[(results['symbol'] == 'ALL') & (results['horizon'] == horizon) &
+                          results['label'].map(LABEL_DIRECTION).ne(0)]
+    directional = directional.assign(hits=directional['hit_rate'] * directional['count'])
+    grouped = directional.groupby(['window', 'threshold', 'streak'])[['hits', 'count']].sum()
+    grouped = grouped[grouped['count'] >= min_count]
+    grouped['hit_rate'] = grouped['hits'] / grouped['count']
+    return grouped.drop(columns='hits').sort_values('hit_rate', ascending=False).head(top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parameter sweep backtest for the OI sentiment rules")
+    parser.add_argument("--symbols", nargs="+", default=SYMBOLS)
+    parser.add_argument("--start", help="first day (YYYY-MM-DD) of stored snapshots")
+    parser.add_argument("--end", help="last day (YYYY-MM-DD) of stored snapshots")
+    parser.add_argument("--csv", nargs="+", help="use bundled OHLC CSVs instead of stored snapshots")
+    parser.add_argument("--windows", nargs="+", type=int, default=WINDOWS)
+    parser.add_argument("--thresholds", nargs="+", type=float, default=THRESHOLDS)
+    parser.add_argument("--streaks", nargs="+", type=int, default=STREAKS)
+    parser.add_argument("--horizons", nargs="+", type=int, default=HORIZONS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    segments = load_csv_segments(args.csv) if args.csv else load_store_segments(args.symbols, args.start, args.end)
+    if not segments:
+        raise SystemExit("⚠️ No input data found")
+    combos = len(args.windows) * len(args.thresholds) * len(args.streaks)
+    print(f"📊 {len(segments)} symbol-days, {sum(len(s[2]) for s in segments)} rows, {combos} parameter sets")
+
+    started = time.perf_counter()
+    results = run_sweep(segments, args.windows, args.thresholds, args.streaks, args.horizons, args.workers)
+    print(f"⏱️ Sweep finished in {time.perf_counter() - started:.1f}s")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_path = os.path.join(OUTPUT_DIR, f"backtest_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    results.to_csv(output_path, index=False)
+    print(f"✅ Results saved to {output_path}")
+    for h in args.horizons:
+        print(f"\n🏆 Top parameter sets by hit rate, {h}-bar horizon:")
+        print(summarize(results, h).to_string())
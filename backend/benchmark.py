@@ -0,0 +1,259 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import platform
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# === SETTINGS ===
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+RESULTS_DIR = os.path.join(BACKEND_DIR, "data", "benchmarks")
+OHLC_SOURCES = os.path.join(REPO_DIR, "*_minute_*-*-*_*-*-*.csv")   # bundled 1-minute broker exports
+REPEAT = 30
+WARMUP = 3
+TOLERANCE = 0.10        # --compare flags a benchmark whose p50 grew by more than this
+SESSION_START = (9, 15)
+
+
+def measure(func, repeat=REPEAT, warmup=WARMUP, before=None):
+    """
+    Wall-clock stats (milliseconds) of `repeat` calls after `warmup` untimed
+    ones. `before` runs untimed ahead of every call (e.g. new input to process).
+    """
+    for _ in range(warmup):
+        if before:
+            before()
+        func()
+    times = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        "runs": repeat,
+        "mean_ms": round(float(times.mean()), 3),
+        "p50_ms": round(float(np.percentile(times, 50)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+        "min_ms": round(float(times.min()), 3),
+        "max_ms": round(float(times.max()), 3),
+        "stdev_ms": round(float(times.std()), 3),
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def prepare_workspace(workspace):
+    """
+    Point the collector and API at a scratch data directory, so benchmark
+    snapshots, sentiments and levels never mix with the real ones. Must run
+    before the backend modules are imported.
+    """
+    data_dir = os.path.join(workspace, "backend", "data")
+    os.makedirs(os.path.join(data_dir, "ohlc"), exist_ok=True)
+    for path in glob.glob(OHLC_SOURCES):
+        shutil.copy(path, os.path.join(data_dir, "ohlc"))
+    os.environ["DASHBOARD_DATA_DIR"] = data_dir
+    os.environ["TOKENS_CSV"] = os.path.join(data_dir, "tokens.csv")
+    os.chdir(workspace)   # main.py and OIBasedSentiments write to backend/data relative to the cwd
+    return data_dir
+
+
+class VirtualClock:
+    """
+    Collector minutes from today's 09:15, one step per worker cycle.
+    """
+    def __init__(self):
+        self.now = datetime.now().replace(hour=SESSION_START[0], minute=SESSION_START[1], second=20, microsecond=0)
+
+    def tick(self):
+        self.now += timedelta(minutes=1)
+        return self.now
+
+
+def run_suite(repeat=REPEAT, warmup=WARMUP, latency=0.0, jitter=0.0, captures=None, only=None):
+    """
+    Run every benchmark against the stub upstream. Returns the results document.
+    """
+    import stub_server
+    import http_pool
+    payloads = stub_server.UpstreamPayloads(captures)
+    stub_server.write_tokens_csv(os.environ["TOKENS_CSV"])
+    stub = stub_server.start(payloads, latency=latency, jitter=jitter)
+    http_pool.redirect_hosts(stub.base_url, stub_server.UPSTREAM_HOSTS)
+
+    import main
+    import file_writer
+    import OIBasedSentiments
+    from levels_service import LevelsService
+    from Server import app
+    logging.getLogger().setLevel(logging.WARNING)   # the collector logs every snapshot line
+
+    symbols = {symbol: market["expiries"] for symbol, market in stub_server.MARKETS.items()}
+    clock = VirtualClock()
+    cycle_pool = ThreadPoolExecutor(max_workers=len(symbols), thread_name_prefix="bench-worker")
+
+    def worker_minute():
+        # The three symbol workers run side by side, as in main.py
+        now = clock.tick()
+        for future in [cycle_pool.submit(main.collect_cycle, s, e, now) for s, e in symbols.items()]:
+            future.result()
+        file_writer.get_writer().flush()
+
+    nifty_expiry = symbols["NIFTY"][0]
+    to_time = datetime.utcnow()
+    from_time = to_time - timedelta(minutes=10)
+    levels = LevelsService(indices=list(stub_server.INDEX_HISTORY_SPOT))   # SENSEX levels come from a local CSV
+    client = app.test_client()
+    encoded = {"Accept-Encoding": "gzip"}
+    cursor = {"snapshots": ""}
+
+    def snapshots_delta():
+        # Uncompressed, to read the cursor back like script.js does
+        response = client.get("/api/snapshots", query_string={"since": cursor["snapshots"]})
+        if response.status_code == 200:
+            cursor["snapshots"] = response.get_json().get("cursor", "")
+
+    def require_chart_points(attempts=30):
+        # An empty /api/chartdata is cheap to serve, so timing it would say nothing
+        for _ in range(attempts):
+            if any(client.get("/api/chartdata").get_json().values()):
+                return
+            worker_minute()
+            OIBasedSentiments.run_sentiment_analysis()
+        raise RuntimeError("/api/chartdata returned no points; the API is not finding the sentiment files")
+
+    benchmarks = [
+        ("sensibull.fetch_data", lambda: main.sensibull_fetcher.fetch_data("NIFTY"), None),
+        ("straddle.fetch_oi_data", lambda: main.straddle_fetcher.fetch_oi_data(
+            "NIFTY", nifty_expiry, from_time.isoformat() + "Z", to_time.isoformat() + "Z"), None),
+        ("worker.cycle", worker_minute, None),
+        ("sentiment.run_sentiment_analysis", OIBasedSentiments.run_sentiment_analysis, worker_minute),
+        ("levels.refresh", levels.refresh, None),
+        ("api.snapshots", lambda: client.get("/api/snapshots", headers=encoded), None),
+        ("api.snapshots_delta", snapshots_delta, worker_minute),
+        ("api.chartdata", lambda: client.get("/api/chartdata", headers=encoded), None),
+        ("api.levels", lambda: client.get("/api/levels/levels_NIFTY_50.json", headers=encoded), None),
+    ]
+    for path in glob.glob(os.path.join(os.environ["DASHBOARD_DATA_DIR"], "ohlc", "*_minute_*.csv"))[:1]:
+        symbol = os.path.basename(path).split("_")[0]
+        benchmarks.append(("api.ohlc_5m", lambda s=symbol: client.get(f"/api/ohlc/{s}/5m", headers=encoded), None))
+
+    results = {}
+    for name, func, before in benchmarks:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        print(f"⏱️ {name} ...", flush=True)
+        if name == "api.chartdata":
+            require_chart_points()
+        results[name] = measure(func, repeat, warmup, before)
+        print(f"   p50 {results[name]['p50_ms']:.2f} ms  p95 {results[name]['p95_ms']:.2f} ms")
+
+    cycle_pool.shutdown()
+    stub.shutdown()
+    http_pool.clear_redirects()
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"repeat": repeat, "warmup": warmup, "latency": latency, "jitter": jitter,
+                     "captures": captures, "recorded_payloads": bool(payloads.recorded)},
+        "upstream_requests": stub.requests,
+        "results": results,
+    }
+
+
+def save_results(report, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"bench_{stamp}_{report['commit']}{'-dirty' if report['dirty'] else ''}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare(baseline_path, candidate_path, tolerance=TOLERANCE, stat="p50_ms"):
+    """
+    Print the change of `stat` per benchmark between two result files.
+    Returns the names that got slower by more than `tolerance`.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"📊 {baseline['commit']} -> {candidate['commit']} ({stat})")
+    regressions = []
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"  {name:<34} {'new':>10} {new[stat]:>10.2f}")
+            continue
+        change = new[stat] / old[stat] - 1 if old[stat] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  ⚠️ slower"
+        print(f"  {name:<34} {old[stat]:>10.2f} {new[stat]:>10.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the collector and API against a local upstream stub")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--captures", help="payload_capture directory to serve instead of synthetic payloads")
+    parser.add_argument("--only", nargs="+", help="benchmark name prefixes to run, e.g. api. worker.")
+    parser.add_argument("--output", help="results file (default: data/benchmarks/bench_<time>_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two results files instead of running; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, tolerance=args.tolerance) else 0)
+
+    captures = os.path.abspath(args.captures) if args.captures else None
+    output = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, BACKEND_DIR)
+    with tempfile.TemporaryDirectory(prefix="dashboard_bench_") as workspace:
+        cwd = os.getcwd()
+        prepare_workspace(workspace)
+        try:
+            report = run_suite(args.repeat, args.warmup, args.latency, args.jitter, captures, args.only)
+        finally:
+            import file_writer
+            file_writer.close_writer()
+            os.chdir(cwd)
+
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        output = save_results(report)
+    print(f"✅ Results saved to {output}")
@@ -0,0 +1,45 @@
+import time as _time
+from datetime import datetime, timedelta
+
+# Wall clock for the collector and API. Code that stamps data, names daily
+# files or buckets caches reads the time from here, so a replay can run the
+# same code on a VirtualClock.
+
+
+class VirtualClock:
+    """
+    Replay time: starts at `start` and only moves when set() or advance() is called.
+    """
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def time(self):
+        return self.current.timestamp()
+
+    def set(self, when):
+        self.current = when
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+
+_source = None
+
+
+def now():
+    return _source.now() if _source is not None else datetime.now()
+
+
+def time():
+    return _source.time() if _source is not None else _time.time()
+
+
+def use(source):
+    """
+    Read the time from `source` (a VirtualClock) from now on; None goes back to real time.
+    """
+    global _source
+    _source = source
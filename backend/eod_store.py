@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+import snapshot_store
+
+# === SETTINGS ===
+DB_PATH = os.path.join(snapshot_store.DATA_DIR, "eod_history.sqlite")
+MARKET_CLOSE = (15, 45)         # after this the day's EOD bar is expected upstream
+RECHECK_MINUTES = 60            # don't ask upstream again for the same missing days sooner than this
+
+_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS eod (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL, high REAL, low REAL, close REAL,
+    PRIMARY KEY (symbol, date)
+);
+CREATE TABLE IF NOT EXISTS sync (
+    symbol TEXT PRIMARY KEY,
+    checked_at TEXT NOT NULL
+);
+"""
+
+
+class EODStore:
+    """
+    On-disk daily OHLC history per index (SQLite). Sources only need to
+    supply the days after last_date(); levels are computed from load().
+    """
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:   # commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def last_date(self, symbol):
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(date) FROM eod WHERE symbol = ?", (symbol,)).fetchone()
+        return pd.Timestamp(row[0]) if row and row[0] else None
+
+    def upsert(self, symbol, frame):
+        """
+        Insert or replace daily bars (columns date/open/high/low/close). Returns rows written.
+        """
+        if frame is None or frame.empty:
+            return 0
+        frame = frame.dropna(subset=['date'])
+        rows = list(zip(
+            [symbol] * len(frame),
+            frame['date'].dt.strftime("%Y-%m-%d"),
+            *(frame[c].astype(float).tolist() for c in ('open', 'high', 'low', 'close')),
+        ))
+        with _lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO eod VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def load(self, symbol, start=None, end=None):
+        query = "SELECT date, open, high, low, close FROM eod WHERE symbol = ?"
+        params = [symbol]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            query += " AND date <= ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        with self._connect() as conn:
+            df = pd.read_sql_query(query + " ORDER BY date", conn, params=params)
+        df['date'] = pd.to_datetime(df['date'], format="%Y-%m-%d")
+        return df
+
+    def mark_checked(self, symbol, when=None):
+        when = (when or datetime.now()).isoformat(timespec="seconds")
+        with _lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sync VALUES (?, ?)", (symbol, when))
+
+    def checked_at(self, symbol):
+        with self._connect() as conn:
+            row = conn.execute("SELECT checked_at FROM sync WHERE symbol = ?", (symbol,)).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def needs_update(self, symbol, now=None):
+        """
+        True when a completed session is missing from the store and upstream
+        hasn't been asked for it in the last RECHECK_MINUTES.
+        """
+        now = now or datetime.now()
+        last = self.last_date(symbol)
+        if last is not None and last.date() >= latest_session(now):
+            return False
+        checked = self.checked_at(symbol)
+        return checked is None or now - checked >= timedelta(minutes=RECHECK_MINUTES)
+
+
+def latest_session(now):
+    """
+    Most recent weekday whose EOD bar should exist upstream by `now`.
+    """
+    day = now.date()
+    if (now.hour, now.minute) < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = EODStore()
+    return _store
@@ -0,0 +1,67 @@
+import time
+import logging
+import metrics
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+
+def call_name(job_name):
+    # "straddle:2025-08-21" -> "straddle"
+    return job_name.split(":", 1)[0]
+
+
+class FetchScheduler:
+    """
+    Sends every upstream request of a collection cycle at once on a shared
+    thread pool, so a cycle takes about as long as its slowest call.
+    """
+    def __init__(self, max_workers=16, default_deadline=12):
+        self.default_deadline = default_deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+
+    @staticmethod
+    def _timed(func, args):
+        start = time.monotonic()
+        result = func(*args)
+        return result, time.monotonic() - start
+
+    def run(self, label, jobs):
+        """
+        jobs: {name: (func, args)} or {name: (func, args, deadline_seconds)}
+        Returns {name: result}. A job that fails or misses its deadline maps to
+        None so the caller can still build a partial snapshot.
+        """
+        start = time.monotonic()
+        pending = {}
+        for name, job in jobs.items():
+            func, args = job[0], job[1]
+            deadline = job[2] if len(job) > 2 else self.default_deadline
+            pending[name] = (self.executor.submit(self._timed, func, args), deadline)
+
+        results, timings = {}, []
+        for name, (future, deadline) in pending.items():
+            remaining = max(0.0, start + deadline - time.monotonic())
+            try:
+                results[name], elapsed = future.result(timeout=remaining)
+                timings.append(f"{name}={elapsed:.2f}s")
+                metrics.observe("upstream_request_seconds", elapsed, call=call_name(name))
+                outcome = "ok" if results[name] is not None else "empty"   # fetchers return None on errors
+            except FuturesTimeout:
+                # The request keeps running in the pool; its result is dropped
+                logging.warning(f"[{label}] {name} missed its {deadline}s deadline")
+                results[name] = None
+                timings.append(f"{name}=timeout")
+                outcome = "timeout"
+            except Exception as e:
+                logging.error(f"[{label}] {name} failed: {e}")
+                results[name] = None
+                timings.append(f"{name}=error")
+                outcome = "error"
+            metrics.inc("upstream_requests_total", call=call_name(name), outcome=outcome)
+
+        wall = time.monotonic() - start
+        metrics.observe("pipeline_stage_seconds", wall, stage="fetch", symbol=label)
+        logging.info(f"[{label}] Cycle fetched in {wall:.2f}s | " + " ".join(timings))
+        return results
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+import os
+import csv
+import logging
+import threading
+import clock
+
+# === SETTINGS ===
+FLUSH_INTERVAL = 2.0    # seconds between background flushes of buffered lines
+FSYNC = False           # also fsync on each background flush and on close
+BUFFER_SIZE = 64 * 1024
+
+
+class DailyFileWriter:
+    """
+    Keeps one open append handle per output file instead of reopening it for
+    every row. Paths are patterns with a {date} placeholder; when the date
+    changes the old handle is closed and the next day's file is opened.
+    Writes are buffered and flushed by a background thread every
+    `flush_interval` seconds (plus fsync when `fsync` is set). Safe to share
+    between threads.
+    """
+    def __init__(self, flush_interval=FLUSH_INTERVAL, fsync=FSYNC, date_format="%Y-%m-%d"):
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.date_format = date_format
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="file-writer", daemon=True)
+        self._thread.start()
+
+    def _entry(self, pattern, date_str, header, binary):
+        path = pattern.format(date=date_str or clock.now().strftime(self.date_format))
+        entry = self._handles.get(pattern)
+        if entry and entry["path"] == path:
+            return entry
+        if entry:
+            self._close_entry(entry)  # day rolled over
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if binary:
+            handle = open(path, "ab", buffering=BUFFER_SIZE)
+        else:
+            handle = open(path, "a", newline="", encoding="utf-8", buffering=BUFFER_SIZE)
+        entry = {"path": path, "handle": handle, "csv": None}
+        if header is not None and handle.tell() == 0:
+            if isinstance(header, str):
+                handle.write(header + "\n")
+            else:
+                self._csv(entry).writerow(header)
+        self._handles[pattern] = entry
+        return entry
+
+    @staticmethod
+    def _csv(entry):
+        if entry["csv"] is None:
+            entry["csv"] = csv.writer(entry["handle"])
+        return entry["csv"]
+
+    def _close_entry(self, entry):
+        try:
+            entry["handle"].flush()
+            if self.fsync:
+                os.fsync(entry["handle"].fileno())
+            entry["handle"].close()
+        except Exception as e:
+            logging.error(f"[FileWriter] Error closing {entry['path']}: {e}")
+
+    def write_line(self, pattern, line, header=None, date_str=None):
+        """Append a text line; `header` (a line) is written first if the file is new."""
+        with self._lock:
+            self._entry(pattern, date_str, header, binary=False)["handle"].write(line + "\n")
+
+    def write_row(self, pattern, row, header=None, date_str=None):
+        """Append a CSV row; `header` (a list) is written first if the file is new."""
+        with self._lock:
+            self._csv(self._entry(pattern, date_str, header, binary=False)).writerow(row)
+
+    def write_bytes(self, pattern, data, date_str=None, flush=True):
+        """Append raw bytes. Flushed straight away by default so readers see whole records."""
+        with self._lock:
+            handle = self._entry(pattern, date_str, None, binary=True)["handle"]
+            handle.write(data)
+            if flush:
+                handle.flush()
+
+    def flush(self):
+        with self._lock:
+            for entry in self._handles.values():
+                entry["handle"].flush()
+                if self.fsync:
+                    os.fsync(entry["handle"].fileno())
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"[FileWriter] Flush error: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        with self._lock:
+            for entry in self._handles.values():
+                self._close_entry(entry)
+            self._handles.clear()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Process-wide writer shared by the collector threads.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = DailyFileWriter()
+        return _writer
+
+
+def close_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
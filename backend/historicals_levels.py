@@ -1,6 +1,10 @@
 # backend/historical_levels.py
-import requests
+import os
 import datetime
+import http_pool
+import eod_store
+import live_bus
+import payload_capture
 import logging
 from urllib.parse import quote
 import json
@@ -9,6 +13,115 @@ from time import sleep
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# === LEVEL PERIODS ===
+# Period levels are the high/low of one group of daily bars: (name, key column, which group).
+# Adding a period is one more entry here plus its key in period_keys().
+PERIOD_LEVELS = [
+    ("PD", "day", "previous"),
+    ("CW", "week", "current"),
+    ("PW", "week", "previous"),
+    ("PM", "month", "previous"),
+    ("PQ", "quarter", "previous"),
+]
+PRICE_DECIMALS = 2
+LEVELS_DIR = "backend/data"
+
+
+def levels_path(symbol, directory=LEVELS_DIR):
+    return os.path.join(directory, f"levels_{symbol.replace(' ', '_')}.json")
+
+
+def records_to_frame(records):
+    """
+    NSE indicesHistory records -> columnar daily OHLC (date as datetime64).
+    """
+    df = pd.DataFrame(records)
+    if df.empty:
+        return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'open': [], 'high': [], 'low': [], 'close': []})
+    return pd.DataFrame({
+        'date': pd.to_datetime(df['EOD_TIMESTAMP'], format="%d-%b-%Y"),
+        'open': pd.to_numeric(df['EOD_OPEN_INDEX_VAL'], errors='coerce'),
+        'high': pd.to_numeric(df['EOD_HIGH_INDEX_VAL'], errors='coerce'),
+        'low': pd.to_numeric(df['EOD_LOW_INDEX_VAL'], errors='coerce'),
+        'close': pd.to_numeric(df['EOD_CLOSE_INDEX_VAL'], errors='coerce'),
+    })
+
+
+def period_keys(dates):
+    """
+    Integer group keys per date: ISO week (year*100+week), month and quarter (year*12/4+n), day ordinal.
+    """
+    iso = dates.dt.isocalendar()
+    return pd.DataFrame({
+        'day': dates.values.astype('datetime64[D]').astype('int64'),
+        'week': iso['year'].astype('int64') * 100 + iso['week'].astype('int64'),
+        'month': dates.dt.year * 12 + dates.dt.month - 1,
+        'quarter': dates.dt.year * 4 + (dates.dt.month - 1) // 3,
+    }, index=dates.index)
+
+
+def pivot_levels(high, low, close):
+    """
+    Classic floor pivots and the central pivot range from one period's H/L/C.
+    """
+    pivot = (high + low + close) / 3
+    bc = (high + low) / 2
+    tc = 2 * pivot - bc
+    return {
+        "PP": pivot,
+        "R1": 2 * pivot - low, "S1": 2 * pivot - high,
+        "R2": pivot + (high - low), "S2": pivot - (high - low),
+        "R3": high + 2 * (pivot - low), "S3": low - 2 * (high - pivot),
+        "TC": max(tc, bc), "BC": min(tc, bc),
+    }
+
+
+def compute_levels(history, today=None):
+    """
+    Levels for every symbol in `history` (columns symbol/date/open/high/low/close)
+    from one set of groupby reductions. Returns {symbol: levels}.
+    """
+    today = pd.Timestamp(today or datetime.date.today()).normalize()
+    history = history.dropna(subset=['date', 'high', 'low']).sort_values(['symbol', 'date'])
+    history = history[history['date'] <= today]
+    keys = period_keys(history['date'])
+    now = period_keys(pd.Series([today, today - pd.Timedelta(days=7),
+                                 today.replace(day=1) - pd.Timedelta(days=1)]))
+    current = {
+        'day': now['day'][0], 'week': now['week'][0], 'month': now['month'][0], 'quarter': now['quarter'][0],
+    }
+    previous = {
+        'week': now['week'][1], 'month': now['month'][2],
+        'quarter': current['quarter'] - 1,
+    }
+
+    results = {symbol: {"symbol": symbol} for symbol in history['symbol'].unique()}
+    # Previous day is the last bar before today, whether or not today's bar is in yet
+    before_today = history[keys['day'] < current['day']]
+    last_day = before_today.groupby('symbol').tail(1).set_index('symbol')
+
+    for name, key, which in PERIOD_LEVELS:
+        if key == 'day':
+            table = last_day[['high', 'low']]
+        else:
+            target = current[key] if which == 'current' else previous[key]
+            in_period = history[keys[key] == target]
+            table = in_period.groupby('symbol').agg(high=('high', 'max'), low=('low', 'min'))
+        for symbol in results:
+            if symbol in table.index:
+                results[symbol][f"{name}H"] = round(float(table.at[symbol, 'high']), PRICE_DECIMALS)
+                results[symbol][f"{name}L"] = round(float(table.at[symbol, 'low']), PRICE_DECIMALS)
+            else:
+                results[symbol][f"{name}H"] = results[symbol][f"{name}L"] = None
+
+    for symbol in results:
+        if symbol in last_day.index and pd.notna(last_day.at[symbol, 'close']):
+            row = last_day.loc[symbol]
+            pivots = pivot_levels(float(row['high']), float(row['low']), float(row['close']))
+            results[symbol].update({k: round(v, PRICE_DECIMALS) for k, v in pivots.items()})
+    return results
+
+
 class HistoricalLevelsCalculator:
     def __init__(self, symbol, from_date, to_date):
         """
@@ -23,8 +136,7 @@ class HistoricalLevelsCalculator:
         self.url = "https://www.nseindia.com/api/historical/indicesHistory"
 
     def _create_session(self):
-        session = requests.Session()
-        session.headers.update({
+        session = http_pool.create_session({
             "User-Agent": self.fixed_user_agent,
             "Accept": "*/*",
             "Accept-Language": "en-US,en;q=0.9",
@@ -35,110 +147,94 @@ class HistoricalLevelsCalculator:
         return session
 
     def fetch_historical_data(self):
+        """
+        Daily OHLC between from_date and to_date from the local EOD store,
+        topping the store up first with only the days it is missing.
+        """
+        store = eod_store.get_store()
         if self.symbol == "SENSEX":
-            return self._fetch_from_csv()
-        else:
-            try:
-                logging.info(f"[{self.symbol}] Fetching data from API")
-                # warm-up homepage request to get cookies
+            store.upsert(self.symbol, self._fetch_from_csv())   # the CSV export is the SENSEX source
+        elif store.needs_update(self.symbol):
+            self._top_up(store)
+        return store.load(self.symbol, start=self._parse_date(self.from_date), end=self._parse_date(self.to_date))
+
+    @staticmethod
+    def _parse_date(value):
+        return pd.to_datetime(value, format="%d-%m-%Y")
+
+    def _top_up(self, store):
+        last = store.last_date(self.symbol)
+        start = self._parse_date(self.from_date)
+        if last is not None:
+            start = max(start, last + pd.Timedelta(days=1))
+        end = self._parse_date(self.to_date)
+        if start > end:
+            return
+        frame = self._fetch_from_api(start.strftime("%d-%m-%Y"), end.strftime("%d-%m-%Y"))
+        # A failed fetch counts as a check too, so callers don't go straight back to NSE
+        store.mark_checked(self.symbol)
+        if frame is None:
+            logging.warning(f"[{self.symbol}] EOD top-up failed, next try in {eod_store.RECHECK_MINUTES} min")
+            return
+        written = store.upsert(self.symbol, frame)
+        logging.info(f"[{self.symbol}] EOD store topped up with {written} days from {start:%d-%m-%Y}")
+
+    def _fetch_from_api(self, from_date, to_date):
+        try:
+            logging.info(f"[{self.symbol}] Fetching {from_date} to {to_date} from API")
+            if not self.session.cookies:
+                # warm-up homepage request to get cookies, once per session
                 self.session.get("https://www.nseindia.com", timeout=10)
                 sleep(1)
-                index_encoded = quote(self.symbol)  # encode spaces to %20
-                url = f"{self.url}?indexType={index_encoded}&from={self.from_date}&to={self.to_date}"
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                records = data.get("data", {}).get("indexCloseOnlineRecords", [])
-                logging.info(f"[{self.symbol}] Fetched {len(records)} records")
-                return records
-            except Exception as e:
-                logging.error(f"[{self.symbol}] Error fetching historical data: {e}")
-                return []
+            index_encoded = quote(self.symbol)  # encode spaces to %20
+            url = f"{self.url}?indexType={index_encoded}&from={from_date}&to={to_date}"
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            payload_capture.capture("indicesHistory", self.symbol, data)
+            records = data.get("data", {}).get("indexCloseOnlineRecords", [])
+            logging.info(f"[{self.symbol}] Fetched {len(records)} records")
+            return records_to_frame(records)
+        except Exception as e:
+            logging.error(f"[{self.symbol}] Error fetching historical data: {e}")
+            return None
 
     def _fetch_from_csv(self):
         try:
             df = pd.read_csv('backend/data/sensex_ohlc_data.csv')
-            df['Date'] = pd.to_datetime(df['Date'], format='%d-%B-%Y')
-            df = df.sort_values('Date', ascending=False)
             logging.info(f"[{self.symbol}] Loaded {len(df)} rows from CSV")
-            records = []
-            for _, row in df.iterrows():
-                records.append({
-                    'EOD_TIMESTAMP': row['Date'].strftime("%d-%b-%Y"),
-                    'EOD_OPEN_INDEX_VAL': row['Open'],
-                    'EOD_HIGH_INDEX_VAL': row['High'],
-                    'EOD_LOW_INDEX_VAL': row['Low'],
-                    'EOD_CLOSE_INDEX_VAL': row['Close']
-                })
-            return records
+            return pd.DataFrame({
+                'date': pd.to_datetime(df['Date'], format='%d-%B-%Y'),
+                'open': pd.to_numeric(df['Open'], errors='coerce'),
+                'high': pd.to_numeric(df['High'], errors='coerce'),
+                'low': pd.to_numeric(df['Low'], errors='coerce'),
+                'close': pd.to_numeric(df['Close'], errors='coerce'),
+            })
         except Exception as e:
             logging.error(f"[{self.symbol}] Error reading CSV: {e}")
-            return []
+            return records_to_frame([])
 
     def calculate_levels(self, data):
-        if not data:
+        if isinstance(data, list):
+            data = records_to_frame(data)
+        if data is None or data.empty:
             logging.warning(f"[{self.symbol}] No data to calculate levels")
             return {}
 
-        today = datetime.datetime.today()
-        current_week = today.isocalendar()[1]
-        current_month = today.month
-
-        prev_week = current_week - 1
-        prev_month = current_month - 1 if current_month > 1 else 12
-
-        # Group data by calendar week & month
-        current_week_data, previous_week_data = [], []
-        current_month_data, previous_month_data = [], []
-
-        for day in data:
-            dt = datetime.datetime.strptime(day['EOD_TIMESTAMP'], "%d-%b-%Y")
-            week = dt.isocalendar()[1]
-            month = dt.month
-
-            if week == current_week:
-                current_week_data.append(day)
-            elif week == prev_week:
-                previous_week_data.append(day)
-
-            if month == current_month:
-                current_month_data.append(day)
-            elif month == prev_month:
-                previous_month_data.append(day)
-
-        # Previous day data: last available date minus today
-        sorted_data = sorted(data, key=lambda d: datetime.datetime.strptime(d['EOD_TIMESTAMP'], "%d-%b-%Y"), reverse=True)
-        prev_day_data = sorted_data[1:2]  # second latest day
-
-        def get_high_low(items):
-            if not items:
-                return None, None
-            highs = [d['EOD_HIGH_INDEX_VAL'] for d in items]
-            lows = [d['EOD_LOW_INDEX_VAL'] for d in items]
-            return max(highs), min(lows)
-
-        PDH, PDL = get_high_low(prev_day_data)
-        CWH, CWL = get_high_low(current_week_data)
-        PWH, PWL = get_high_low(previous_week_data)
-        PMH, PML = get_high_low(previous_month_data)
-
-        levels = {
-            "symbol": self.symbol,
-            "PDH": PDH, "PDL": PDL,
-            "CWH": CWH, "CWL": CWL,
-            "PWH": PWH, "PWL": PWL,
-            "PMH": PMH, "PML": PML
-        }
-
+        levels = compute_levels(data.assign(symbol=self.symbol)).get(self.symbol, {})
         logging.info(f"[{self.symbol}] Levels calculated: {levels}")
         return levels
 
     def save_levels(self, levels):
-        filename = f"backend/data/levels_{self.symbol.replace(' ', '_')}.json"
+        filename = levels_path(self.symbol)
         try:
-            with open(filename, "w") as f:
+            # Write to a temp file and swap it in so readers never see a half-written file
+            tmp_path = f"{filename}.tmp"
+            with open(tmp_path, "w") as f:
                 json.dump(levels, f, indent=2)
+            os.replace(tmp_path, filename)
             logging.info(f"[{self.symbol}] Levels saved to {filename}")
+            live_bus.publish("levels", levels)
         except Exception as e:
             logging.error(f"[{self.symbol}] Error saving levels: {e}")
 
@@ -0,0 +1,175 @@
+import threading
+import requests
+import metrics
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# === POOL SETTINGS (change via configure() before the first request) ===
+POOL_SIZE = 16          # keep-alive connections kept per host
+RETRIES = 2
+BACKOFF_FACTOR = 0.3    # 0.3s, 0.6s, ... between retries
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_adapter = None
+_session = None
+_metrics = {}
+_redirects = {}         # upstream host -> base URL it is served from instead
+
+
+def configure(pool_size=None, retries=None, backoff_factor=None):
+    """
+    Overrides the pool settings. Only affects sessions created afterwards.
+    """
+    global POOL_SIZE, RETRIES, BACKOFF_FACTOR, _adapter, _session
+    with _lock:
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if retries is not None:
+            RETRIES = retries
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = backoff_factor
+        _adapter = None
+        _session = None
+
+
+def _get_adapter():
+    global _adapter
+    if _adapter is None:
+        retry = Retry(
+            total=RETRIES,
+            backoff_factor=BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False,
+        )
+        _adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    return _adapter
+
+
+def _record_response(response, *args, **kwargs):
+    host = urlsplit(response.url).netloc
+    with _lock:
+        stats = _metrics.setdefault(host, {"requests": 0, "errors": 0, "total_seconds": 0.0})
+        stats["requests"] += 1
+        stats["total_seconds"] += response.elapsed.total_seconds()
+        if response.status_code >= 400:
+            stats["errors"] += 1
+    metrics.observe("http_pool_request_seconds", response.elapsed.total_seconds(), host=host)
+
+
+def redirect_hosts(base_url, hosts):
+    """
+    Route requests for `hosts` to {base_url}/{host}/{path} instead, e.g. a
+    local stub_server for benchmarks and replays. Applies to every session.
+    """
+    with _lock:
+        for host in hosts:
+            _redirects[host] = base_url.rstrip("/")
+
+
+def clear_redirects():
+    with _lock:
+        _redirects.clear()
+
+
+def _resolve(url):
+    if not _redirects:
+        return url
+    parts = urlsplit(url)
+    base = _redirects.get(parts.netloc)
+    if base is None:
+        return url
+    target = f"{base}/{parts.netloc}{parts.path or '/'}"
+    return f"{target}?{parts.query}" if parts.query else target
+
+
+class PooledSession(requests.Session):
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, _resolve(url), *args, **kwargs)
+
+
+def create_session(headers=None):
+    """
+    New session (own cookie jar and headers) backed by the shared connection pool.
+    """
+    with _lock:
+        adapter = _get_adapter()
+    session = PooledSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(_record_response)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_session():
+    """
+    Process-wide session shared by the fetchers that pass cookies per call.
+    """
+    global _session
+    if _session is None:
+        session = create_session()
+        with _lock:
+            if _session is None:
+                _session = session
+    return _session
+
+
+def request(method, url, **kwargs):
+    try:
+        return get_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        host = urlsplit(url).netloc
+        with _lock:
+            stats = _metrics.setdefault(host, {"requests": 0, "errors": 0, "total_seconds": 0.0})
+            stats["errors"] += 1
+        raise
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def host_metrics():
+    """
+    Per-host request counts, error counts, mean latency and how many TCP/TLS
+    connections the pool has opened so far.
+    """
+    with _lock:
+        report = {host: dict(stats) for host, stats in _metrics.items()}
+        adapter = _adapter
+    for stats in report.values():
+        stats["avg_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        stats["connections_opened"] = 0
+    if adapter is not None:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            stats = report.setdefault(host, {"requests": 0, "errors": 0, "total_seconds": 0.0, "avg_seconds": 0.0,
+                                             "connections_opened": 0})
+            stats["connections_opened"] += pool.num_connections
+    return report
+
+
+@metrics.on_scrape
+def _export_metrics():
+    for host, stats in host_metrics().items():
+        metrics.set_gauge("http_pool_requests_total", stats["requests"], host=host)
+        metrics.set_gauge("http_pool_errors_total", stats["errors"], host=host)
+        metrics.set_gauge("http_pool_connections", stats["connections_opened"], host=host)
+
+
+def log_metrics(logger):
+    for host, stats in sorted(host_metrics().items()):
+        logger.info(f"[HTTP] {host}: {stats['requests']} req, {stats['errors']} err, "
+                    f"avg {stats['avg_seconds']:.3f}s, {stats['connections_opened']} connections")
@@ -0,0 +1,277 @@
+import math
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from OIBasedSentiments import RollingStats
+
+# === SETTINGS ===
+# Parameters of the *_IndicatorSentiments.csv exports
+DI_PERIOD = 14
+NETDI_MA = 9
+NETDI_THRESHOLD = 20
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+MACD_THRESHOLD = 5
+BB_PERIOD = 20
+BB_STD = 2
+BB_MIN_WIDTH = 45
+FLAT_ATR = 1e-9     # ATR below this is a flat window (the sliding mean leaves rounding dust, not an exact 0)
+
+COLUMNS = ['datetime', 'High', 'Low', 'Close', 'DI+', 'DI-', 'ADX', 'NetDI', 'NetDI_MA9', 'Sentiment',
+           'MACD', 'Signal', 'Histogram', 'MACD_Sentiment_5', 'MiddleBB', 'UpperBB', 'LowerBB', 'BB_Width',
+           'BB_Sentiment']
+
+
+# === LABEL RULES ===
+def di_sentiment(net_di, net_di_ma):
+    # A strong directional reading that is fading against its MA9 is only "weak"
+    if math.isnan(net_di_ma):
+        return 'Sideways'
+    if net_di > NETDI_THRESHOLD:
+        return 'weak Bullish' if net_di < net_di_ma else 'Bullish'
+    if net_di < -NETDI_THRESHOLD:
+        return 'weak Bearish' if net_di > net_di_ma else 'Bearish'
+    return 'Sideways'
+
+
+def macd_sentiment(histogram):
+    if histogram > MACD_THRESHOLD:
+        return 'Bullish'
+    if histogram < -MACD_THRESHOLD:
+        return 'Bearish'
+    return 'Sideways'
+
+
+def bb_sentiment(close, upper, lower, width):
+    # Band breaks only count once the bands are wide enough to mean something
+    if math.isnan(width) or width <= BB_MIN_WIDTH:
+        return 'Sideways'
+    if close > upper:
+        return 'Bullish'
+    if close < lower:
+        return 'Bearish'
+    return 'Sideways'
+
+
+# === VECTORIZED ===
+def rolling_mean(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def rolling_std(values, window):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=1)
+    return out
+
+
+def ema(values, span):
+    # Recursive, seeded with the first value (pandas ewm adjust=False); the loop runs in C
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def directional(high, low, close):
+    """
+    DI+, DI-, ADX and NetDI with simple moving averages over DI_PERIOD bars.
+    """
+    prev_close = np.r_[np.nan, close[:-1]]
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    up = np.r_[np.nan, np.diff(high)]
+    down = np.r_[np.nan, -np.diff(low)]
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+
+    atr = rolling_mean(tr, DI_PERIOD)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # A flat window (no true range) has no direction either: DI 0, not 0/0
+        di_plus = np.where(atr < FLAT_ATR, 0.0, 100 * rolling_mean(plus_dm, DI_PERIOD) / atr)
+        di_minus = np.where(atr < FLAT_ATR, 0.0, 100 * rolling_mean(minus_dm, DI_PERIOD) / atr)
+        di_sum = di_plus + di_minus
+        dx = np.where(di_sum == 0, 0.0, 100 * np.abs(di_plus - di_minus) / di_sum)
+    first = DI_PERIOD - 1
+    adx = np.full(len(close), np.nan)
+    adx[first:] = rolling_mean(dx[first:], DI_PERIOD)
+    return di_plus, di_minus, adx, di_plus - di_minus
+
+
+def compute_indicators(df):
+    """
+    All IndicatorSentiments columns for an OHLC frame (datetime/High/Low/Close,
+    any timeframe, e.g. ohlc_resampler.to_frame()) in one pass of array ops.
+    """
+    high = df['High'].to_numpy(dtype=np.float64)
+    low = df['Low'].to_numpy(dtype=np.float64)
+    close = df['Close'].to_numpy(dtype=np.float64)
+
+    di_plus, di_minus, adx, net_di = directional(high, low, close)
+    net_di_ma = np.full(len(close), np.nan)
+    net_di_ma[DI_PERIOD - 1:] = rolling_mean(net_di[DI_PERIOD - 1:], NETDI_MA)
+    di_up, di_down = net_di > NETDI_THRESHOLD, net_di < -NETDI_THRESHOLD
+    sentiment = np.select(
+        [np.isnan(net_di_ma), di_up & (net_di < net_di_ma), di_up, di_down & (net_di > net_di_ma), di_down],
+        ['Sideways', 'weak Bullish', 'Bullish', 'weak Bearish', 'Bearish'], 'Sideways')
+
+    macd = ema(close, MACD_FAST) - ema(close, MACD_SLOW)
+    signal = ema(macd, MACD_SIGNAL)
+    histogram = macd - signal
+    macd_label = np.select([histogram > MACD_THRESHOLD, histogram < -MACD_THRESHOLD], ['Bullish', 'Bearish'], 'Sideways')
+
+    middle = rolling_mean(close, BB_PERIOD)
+    std = rolling_std(close, BB_PERIOD)
+    upper, lower = middle + BB_STD * std, middle - BB_STD * std
+    width = upper - lower
+    wide = width > BB_MIN_WIDTH
+    bb_label = np.select([wide & (close > upper), wide & (close < lower)], ['Bullish', 'Bearish'], 'Sideways')
+
+    return pd.DataFrame({
+        'datetime': df['datetime'].to_numpy(), 'High': high, 'Low': low, 'Close': close,
+        'DI+': di_plus, 'DI-': di_minus, 'ADX': adx, 'NetDI': net_di, 'NetDI_MA9': net_di_ma, 'Sentiment': sentiment,
+        'MACD': macd.round(2), 'Signal': signal.round(2), 'Histogram': histogram.round(2), 'MACD_Sentiment_5': macd_label,
+        'MiddleBB': middle, 'UpperBB': upper, 'LowerBB': lower, 'BB_Width': width, 'BB_Sentiment': bb_label,
+    }, columns=COLUMNS)
+
+
+# === INCREMENTAL ===
+class IndicatorState:
+    """
+    Same indicators updated one bar at a time in O(1): fixed-size rolling
+    windows and recursive EMAs. update() commits a closed bar; preview()
+    evaluates a still-forming bar without changing the state.
+    """
+    def __init__(self):
+        self.prev = None            # (high, low, close) of the last committed bar
+        self.tr = RollingStats(DI_PERIOD)
+        self.plus_dm = RollingStats(DI_PERIOD)
+        self.minus_dm = RollingStats(DI_PERIOD)
+        self.dx = RollingStats(DI_PERIOD)
+        self.net_di = RollingStats(NETDI_MA)
+        self.close = RollingStats(BB_PERIOD)
+        self.ema_fast = self.ema_slow = self.ema_signal = None
+
+    def _step(self, high, low, close, commit):
+        stats = self if commit else self._copy()
+        if stats.prev is None:
+            tr, plus_dm, minus_dm = high - low, 0.0, 0.0
+        else:
+            prev_high, prev_low, prev_close = stats.prev
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            up, down = high - prev_high, prev_low - low
+            plus_dm = up if up > down and up > 0 else 0.0
+            minus_dm = down if down > up and down > 0 else 0.0
+
+        atr, _ = stats.tr.push(tr)
+        plus_mean, minus_mean = stats.plus_dm.push(plus_dm)[0], stats.minus_dm.push(minus_dm)[0]
+        if atr < FLAT_ATR:
+            di_plus = di_minus = 0.0     # flat window, as in directional()
+        else:
+            di_plus, di_minus = 100 * plus_mean / atr, 100 * minus_mean / atr
+        net_di = di_plus - di_minus
+        if math.isnan(net_di):
+            adx = net_di_ma = float('nan')
+        else:
+            di_sum = di_plus + di_minus
+            adx, _ = stats.dx.push(0.0 if di_sum == 0 else 100 * abs(net_di) / di_sum)
+            net_di_ma, _ = stats.net_di.push(net_di)
+
+        if stats.ema_fast is None:
+            stats.ema_fast = stats.ema_slow = close
+            stats.ema_signal = 0.0
+        else:
+            stats.ema_fast += (close - stats.ema_fast) * 2 / (MACD_FAST + 1)
+            stats.ema_slow += (close - stats.ema_slow) * 2 / (MACD_SLOW + 1)
+        macd = stats.ema_fast - stats.ema_slow
+        if stats.prev is not None:
+            stats.ema_signal += (macd - stats.ema_signal) * 2 / (MACD_SIGNAL + 1)
+        histogram = macd - stats.ema_signal
+
+        middle, std = stats.close.push(close)
+        upper, lower = middle + BB_STD * std, middle - BB_STD * std
+        width = upper - lower
+        stats.prev = (high, low, close)
+
+        return {
+            'High': high, 'Low': low, 'Close': close,
+            'DI+': di_plus, 'DI-': di_minus, 'ADX': adx, 'NetDI': net_di, 'NetDI_MA9': net_di_ma,
+            'Sentiment': di_sentiment(net_di, net_di_ma),
+            'MACD': round(macd, 2), 'Signal': round(stats.ema_signal, 2), 'Histogram': round(histogram, 2),
+            'MACD_Sentiment_5': macd_sentiment(histogram),
+            'MiddleBB': middle, 'UpperBB': upper, 'LowerBB': lower, 'BB_Width': width,
+            'BB_Sentiment': bb_sentiment(close, upper, lower, width),
+        }
+
+    def _copy(self):
+        clone = IndicatorState.__new__(IndicatorState)
+        clone.__dict__.update(self.__dict__)
+        for name in ['tr', 'plus_dm', 'minus_dm', 'dx', 'net_di', 'close']:
+            stats = getattr(self, name)
+            copy = RollingStats(stats.window)
+            copy.values, copy.mean, copy.m2 = deque(stats.values), stats.mean, stats.m2
+            setattr(clone, name, copy)
+        return clone
+
+    def update(self, high, low, close):
+        return self._step(float(high), float(low), float(close), commit=True)
+
+    def preview(self, high, low, close):
+        return self._step(float(high), float(low), float(close), commit=False)
+
+
+def compute_incremental(df):
+    state = IndicatorState()
+    rows = [state.update(h, l, c) for h, l, c in zip(df['High'], df['Low'], df['Close'])]
+    out = pd.DataFrame(rows)
+    out.insert(0, 'datetime', df['datetime'].to_numpy())
+    return out[COLUMNS]
+
+
+# === GOLDEN FILE BENCHMARK ===
+def compare(result, golden, tolerance=1e-6):
+    """
+    Max abs difference per numeric column and mismatch count per label column.
+    """
+    report = {}
+    for col in COLUMNS[1:]:
+        if not pd.api.types.is_numeric_dtype(golden[col]):
+            report[col] = int((result[col].to_numpy() != golden[col].to_numpy()).sum())
+        else:
+            a, b = result[col].to_numpy(dtype=np.float64), golden[col].to_numpy(dtype=np.float64)
+            nan_mismatch = int((np.isnan(a) != np.isnan(b)).sum())
+            both = ~np.isnan(a) & ~np.isnan(b)
+            diff = float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+            report[col] = 0 if diff <= tolerance and not nan_mismatch else f"max diff {diff:.3g}, {nan_mismatch} NaN mismatches"
+    return report
+
+
+def benchmark(golden_csv, repeat=20):
+    golden = pd.read_csv(golden_csv)
+    ohlc = golden[['datetime', 'High', 'Low', 'Close']]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        vectorized = compute_indicators(ohlc)
+    vec_ms = (time.perf_counter() - start) / repeat * 1000
+
+    start = time.perf_counter()
+    incremental = compute_incremental(ohlc)
+    inc_us = (time.perf_counter() - start) / len(ohlc) * 1e6
+
+    print(f"📊 {len(ohlc)} bars from {golden_csv}")
+    print(f"⚡ Vectorized: {vec_ms:.2f} ms per full pass")
+    print(f"⏱️ Incremental: {inc_us:.1f} µs per bar")
+    for name, result in [('vectorized', vectorized), ('incremental', incremental)]:
+        report = compare(result, golden)
+        bad = {col: v for col, v in report.items() if v}
+        print(f"✅ {name} matches golden file" if not bad else f"❌ {name} differs: {bad}")
+    return vectorized, incremental
+
+
+if __name__ == "__main__":
+    import sys
+    # python indicators.py <..._IndicatorSentiments.csv> [repeat]
+    benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,96 @@
+import logging
+import threading
+from datetime import timedelta
+import pandas as pd
+import clock
+import eod_store
+from historicals_levels import HistoricalLevelsCalculator, compute_levels
+
+# === SETTINGS ===
+LEVEL_INDICES = ["NIFTY 50", "NIFTY BANK", "SENSEX"]
+HISTORY_DAYS = 200          # enough daily bars for the previous quarter
+CHECK_INTERVAL = 60         # seconds between "is a new session due?" checks
+RETRY_BASE = 60             # after a failed refresh wait this long, doubling per failure...
+RETRY_MAX = 3600            # ...up to this, so an unreachable NSE is not polled every minute
+
+
+class LevelsService:
+    """
+    Recomputes levels for every index together once per session (a new day,
+    or a new EOD bar after the close) and on demand. The latest results are
+    kept in memory, written atomically to the levels_*.json files and
+    published on the live bus for the API.
+    """
+    def __init__(self, indices=LEVEL_INDICES, history_days=HISTORY_DAYS):
+        self.indices = indices
+        self.history_days = history_days
+        self.calculators = {}   # kept between refreshes so each keeps its NSE session
+        self.levels = {}
+        self.session_key = None
+        self.failures = 0           # failed refreshes in a row
+        self.retry_at = None        # no automatic refresh before this after a failure
+        self.lock = threading.Lock()
+        self.refresh_requested = threading.Event()
+
+    def _session_key(self, now):
+        return now.date(), eod_store.latest_session(now)
+
+    def refresh(self, now=None):
+        now = now or clock.now()
+        from_date = (now - timedelta(days=self.history_days)).strftime("%d-%m-%Y")
+        to_date = now.strftime("%d-%m-%Y")
+        with self.lock:
+            frames = []
+            for symbol in self.indices:
+                calc = self.calculators.get(symbol)
+                if calc is None:
+                    calc = self.calculators[symbol] = HistoricalLevelsCalculator(symbol, from_date, to_date)
+                calc.from_date, calc.to_date = from_date, to_date
+                history = calc.fetch_historical_data()
+                if history is not None and not history.empty:
+                    frames.append(history.assign(symbol=symbol))
+            if not frames:
+                logging.warning("[Levels] No history available for any index")
+                return self.levels
+
+            results = compute_levels(pd.concat(frames, ignore_index=True), today=now.date())
+            for symbol, levels in results.items():
+                self.calculators[symbol].save_levels(levels)
+            self.levels = results
+            self.session_key = self._session_key(now)
+            logging.info(f"[Levels] Recomputed levels for {', '.join(results)}")
+            return results
+
+    def request_refresh(self):
+        self.refresh_requested.set()
+
+    def handle_command(self, command, data):
+        if command == "refresh_levels":
+            logging.info("[Levels] Refresh requested")
+            self.request_refresh()
+
+    def _record_attempt(self, now, key):
+        if self.session_key == key:
+            self.failures, self.retry_at = 0, None
+            return
+        self.failures += 1
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (self.failures - 1))
+        self.retry_at = now + timedelta(seconds=delay)
+        logging.warning(f"[Levels] Refresh failed {self.failures} time(s) in a row, next try at {self.retry_at:%H:%M:%S}")
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            now = clock.now()
+            key = self._session_key(now)
+            requested = self.refresh_requested.is_set()
+            due = key != self.session_key and (self.retry_at is None or now >= self.retry_at)
+            if requested or due:
+                self.refresh_requested.clear()
+                try:
+                    self.refresh(now)
+                except Exception as e:
+                    logging.error(f"[Levels] Error recomputing levels: {e}")
+                self._record_attempt(now, key)
+            for _ in range(CHECK_INTERVAL):
+                if stop_event.wait(1) or self.refresh_requested.is_set():
+                    break
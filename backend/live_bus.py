@@ -0,0 +1,144 @@
+import json
+import queue
+import socket
+import logging
+import threading
+
+# === SETTINGS ===
+# The collector (main.py) and the API (Server.py) run as separate processes;
+# events cross between them as JSON datagrams on localhost.
+BUS_HOST = "127.0.0.1"
+BUS_PORT = 5055
+COMMAND_PORT = 5056     # API -> collector requests (e.g. refresh levels now)
+MAX_DATAGRAM = 65000
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_send_socket = None
+_send_lock = threading.Lock()
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_listener = None
+
+
+def _json_default(value):
+    # numpy / pandas scalars
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def encode(topic, data):
+    return json.dumps({"topic": topic, "data": data}, default=_json_default, allow_nan=False)
+
+
+def publish(topic, data):
+    """
+    Fire-and-forget: send an event to the API process and to any subscribers
+    in this process. Never blocks or raises on the caller's hot path.
+    """
+    global _send_socket
+    try:
+        message = encode(topic, data)
+    except ValueError as e:
+        logging.error(f"[LiveBus] Could not encode {topic} event: {e}")
+        return
+    if _listener is None:
+        _broadcast(message)  # with a listener here, the datagram below delivers it
+    payload = message.encode("utf-8")
+    if len(payload) > MAX_DATAGRAM:
+        logging.warning(f"[LiveBus] {topic} event too large to send ({len(payload)} bytes)")
+        return
+    try:
+        with _send_lock:
+            if _send_socket is None:
+                _send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _send_socket.sendto(payload, (BUS_HOST, BUS_PORT))
+    except OSError as e:
+        logging.debug(f"[LiveBus] Send failed: {e}")
+
+
+def _broadcast(message):
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            pass  # slow client: it catches up through the polling endpoints
+
+
+def subscribe():
+    """
+    Queue of encoded events ({"topic", "data"} JSON strings) for one client.
+    """
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(q)
+    return q
+
+
+def unsubscribe(q):
+    with _subscribers_lock:
+        _subscribers.discard(q)
+
+
+def _listen(sock):
+    while True:
+        try:
+            payload, _ = sock.recvfrom(MAX_DATAGRAM + 1024)
+            _broadcast(payload.decode("utf-8"))
+        except Exception as e:
+            logging.error(f"[LiveBus] Listener error: {e}")
+
+
+def start_listener(host=BUS_HOST, port=BUS_PORT):
+    """
+    Receive events published by other local processes and hand them to this
+    process's subscribers. Safe to call more than once.
+    """
+    global _listener
+    with _subscribers_lock:
+        if _listener is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((host, port))
+        _listener = threading.Thread(target=_listen, args=(sock,), name="live-bus", daemon=True)
+        _listener.start()
+    logging.info(f"[LiveBus] Listening for collector events on {host}:{port}")
+
+
+# === COMMANDS (API -> collector) ===
+def send_command(command, data=None, host=BUS_HOST, port=COMMAND_PORT):
+    """
+    Ask the collector process to do something now. Fire-and-forget.
+    """
+    try:
+        payload = encode(command, data).encode("utf-8")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(payload, (host, port))
+        return True
+    except (OSError, ValueError) as e:
+        logging.error(f"[LiveBus] Could not send {command} command: {e}")
+        return False
+
+
+def start_command_listener(handler, host=BUS_HOST, port=COMMAND_PORT):
+    """
+    Call handler(command, data) for each command datagram, on a daemon thread.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((host, port))
+
+    def listen():
+        while True:
+            try:
+                payload, _ = sock.recvfrom(MAX_DATAGRAM + 1024)
+                message = json.loads(payload.decode("utf-8"))
+                handler(message["topic"], message["data"])
+            except Exception as e:
+                logging.error(f"[LiveBus] Command error: {e}")
+
+    thread = threading.Thread(target=listen, name="live-bus-commands", daemon=True)
+    thread.start()
+    logging.info(f"[LiveBus] Listening for commands on {host}:{port}")
+    return thread
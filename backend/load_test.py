@@ -0,0 +1,159 @@
+import time
+import argparse
+import threading
+import requests
+import numpy as np
+from collections import Counter
+
+# === SETTINGS ===
+BASE_URL = "http://127.0.0.1:5000"
+LEVEL_FILES = ["levels_NIFTY_50.json", "levels_NIFTY_BANK.json", "levels_SENSEX.json"]
+
+
+class DashboardClient:
+    """
+    One simulated browser tab: the same requests script.js makes on every
+    refresh (snapshot and chart deltas with cursors, the three levels files),
+    sending If-None-Match like a browser cache would.
+    """
+    def __init__(self, base_url, use_cursors=True):
+        self.base_url = base_url
+        self.use_cursors = use_cursors
+        self.session = requests.Session()
+        self.cursors = {"/api/snapshots": "", "/api/chartdata": ""}
+        self.etags = {}
+
+    def _get(self, path, params, results):
+        headers = {}
+        if path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.base_url + path, params=params, headers=headers, timeout=30)
+            elapsed = time.perf_counter() - start
+            status = response.status_code
+            size = len(response.content)
+            if response.headers.get("ETag"):
+                self.etags[path] = response.headers["ETag"]
+            if status == 200 and path in self.cursors and self.use_cursors:
+                self.cursors[path] = response.json().get("cursor", "")
+        except requests.RequestException:
+            elapsed, status, size = time.perf_counter() - start, "error", 0
+        results.append((elapsed, status, size))
+
+    def refresh(self, results):
+        for path in self.cursors:
+            params = {"since": self.cursors[path]} if self.use_cursors else None
+            self._get(path, params, results)
+        for filename in LEVEL_FILES:
+            self._get(f"/api/levels/{filename}", None, results)
+
+
+class StreamClient:
+    """
+    One tab's /api/stream connection, held open for the whole run like
+    script.js's EventSource. Counts events and heartbeats received.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.status = None
+        self.events = 0
+        self.heartbeats = 0
+
+    def run(self, stop):
+        try:
+            with requests.get(self.base_url + "/api/stream", stream=True, timeout=(10, 60)) as response:
+                self.status = response.status_code
+                if response.status_code != 200:
+                    return
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        self.events += 1
+                    elif line.startswith(":"):
+                        self.heartbeats += 1
+                    if stop.is_set():
+                        break
+        except requests.RequestException:
+            self.status = self.status or "error"
+
+
+def run_load_test(base_url=BASE_URL, clients=50, duration=30, think_time=0.0, use_cursors=True, streams=0):
+    """
+    Run `clients` concurrent dashboard clients for `duration` seconds, with
+    `streams` /api/stream connections held open alongside them.
+    think_time is the pause between refreshes (the dashboard uses 30s);
+    0 measures the server's maximum throughput.
+    """
+    results = []
+    stop = threading.Event()
+    stream_clients = [StreamClient(base_url) for _ in range(streams)]
+    stream_threads = [threading.Thread(target=c.run, args=(stop,), daemon=True) for c in stream_clients]
+    for t in stream_threads:
+        t.start()
+
+    def client_loop():
+        client = DashboardClient(base_url, use_cursors)
+        local = []
+        while not stop.is_set():
+            client.refresh(local)
+            if think_time:
+                stop.wait(think_time)
+        results.extend(local)
+
+    threads = [threading.Thread(target=client_loop, daemon=True) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    for t in stream_threads:
+        t.join(timeout=1)   # a stream only notices `stop` on its next line (<= one heartbeat)
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses = Counter(str(r[1]) for r in results)
+    report = {
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "requests": len(results),
+        "requests_per_sec": round(len(results) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else None,
+        "max_ms": round(float(latencies.max()), 2) if len(latencies) else None,
+        "bytes_per_request": round(sum(r[2] for r in results) / max(len(results), 1), 1),
+        "statuses": dict(statuses),
+        "streams": streams,
+        "stream_statuses": dict(Counter(str(c.status) for c in stream_clients)),
+        "stream_events": sum(c.events for c in stream_clients),
+    }
+    return report
+
+
+def print_report(report):
+    print(f"👥 {report['clients']} clients for {report['duration_s']}s")
+    print(f"📈 {report['requests']} requests, {report['requests_per_sec']} req/s")
+    print(f"⏱️ p50 {report['p50_ms']} ms | p95 {report['p95_ms']} ms | p99 {report['p99_ms']} ms | max {report['max_ms']} ms")
+    print(f"📦 {report['bytes_per_request']} bytes/request (body, after decompression)")
+    print(f"🔢 Statuses: {report['statuses']}")
+    if report["streams"]:
+        print(f"📡 {report['streams']} streams: {report['stream_statuses']}, {report['stream_events']} events")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the dashboard API with concurrent simulated clients")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50],
+                        help="one or more client counts to run in sequence, e.g. 10 50 200")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between refreshes per client")
+    parser.add_argument("--full", action="store_true", help="request full bodies instead of cursor deltas")
+    parser.add_argument("--streams", type=int, default=0,
+                        help="/api/stream connections to hold open during the run (one per dashboard tab)")
+    args = parser.parse_args()
+
+    for count in args.clients:
+        print_report(run_load_test(args.url, count, args.duration, args.think, use_cursors=not args.full,
+                                   streams=args.streams))
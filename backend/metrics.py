@@ -0,0 +1,180 @@
+import os
+import glob
+import time
+import bisect
+import logging
+import threading
+import clock
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === SETTINGS ===
+METRICS_HOST = "127.0.0.1"
+COLLECTOR_PORT = 9105           # the API serves the same format on /metrics
+# Latency buckets in seconds: a few ms for local work up to the per-call deadlines
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+# name -> (type, help). Only metrics listed here can be recorded.
+METRICS = {
+    "upstream_request_seconds": ("histogram", "Upstream call latency by call (sensibull, vix, straddle, oi, quotes, ...)"),
+    "upstream_requests_total": ("counter", "Upstream calls by call and outcome (ok, error, timeout)"),
+    "http_pool_request_seconds": ("histogram", "Time to response headers per HTTP request, by host"),
+    "http_pool_requests_total": ("counter", "HTTP requests sent through the shared pool, by host"),
+    "http_pool_errors_total": ("counter", "HTTP requests that failed or returned >= 400, by host"),
+    "http_pool_connections": ("gauge", "TCP/TLS connections opened by the pool, by host"),
+    "pipeline_stage_seconds": ("histogram", "Time spent per pipeline stage (fetch, token_mapping, aggregation, write, sentiment, ...)"),
+    "collector_cycle_seconds": ("histogram", "Wall time of one collector cycle, by job"),
+    "collector_cycle_lag_seconds": ("gauge", "How late the last cycle started after its slot, by job"),
+    "collector_cycle_overruns_total": ("counter", "Cycles that ran past the next slot, by job"),
+    "collector_cycles_total": ("counter", "Completed collector cycles, by job"),
+    "collector_slots_skipped_total": ("counter", "Slots dropped by a job's overrun policy, by job and policy"),
+    "data_file_bytes": ("gauge", "Size of today's data files"),
+    "api_requests_total": ("counter", "API requests by endpoint and status"),
+    "api_request_seconds": ("histogram", "API request latency by endpoint"),
+    "api_response_bytes_total": ("counter", "API response body bytes sent, by endpoint"),
+    "api_stream_clients": ("gauge", "Open /api/stream connections"),
+}
+
+_lock = threading.Lock()
+_samples = {name: {} for name in METRICS}     # name -> {label tuple: value | histogram state}
+_scrape_hooks = []
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _samples[name]
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _samples[name][_key(labels)] = value
+
+
+def observe(name, seconds, **labels):
+    """
+    Add one observation to a histogram.
+    """
+    key = _key(labels)
+    with _lock:
+        state = _samples[name].get(key)
+        if state is None:
+            state = _samples[name][key] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+        state["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+        state["sum"] += seconds
+        state["count"] += 1
+
+
+@contextmanager
+def timed(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def on_scrape(hook):
+    """
+    Run `hook()` before every render, for values read on demand (file sizes, pool stats).
+    """
+    _scrape_hooks.append(hook)
+    return hook
+
+
+def track_files(patterns):
+    """
+    Report the size of every file matching `patterns` (globs; {date} is clock's today) as data_file_bytes.
+    """
+    def hook():
+        date_str = clock.now().strftime("%Y-%m-%d")
+        sizes = {}
+        for pattern in patterns:
+            for path in glob.glob(pattern.format(date=date_str)):
+                try:
+                    sizes[os.path.basename(path)] = os.path.getsize(path)
+                except OSError:
+                    pass
+        with _lock:
+            _samples["data_file_bytes"] = {(("file", name),): size for name, size in sizes.items()}
+    return on_scrape(hook)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    for hook in list(_scrape_hooks):
+        try:
+            hook()
+        except Exception as e:
+            logging.error(f"[Metrics] Scrape hook failed: {e}")
+
+    lines = []
+    with _lock:
+        for name, (kind, help_text) in METRICS.items():
+            series = _samples[name]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(key)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), value["buckets"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {value['sum']:.6f}")
+                lines.append(f"{name}_count{_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        for name in _samples:
+            _samples[name] = {}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=COLLECTOR_PORT, host=METRICS_HOST):
+    """
+    Serve /metrics for this process from a background thread.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"[Metrics] Serving http://{host}:{port}/metrics")
+    return server
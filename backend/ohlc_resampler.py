@@ -0,0 +1,279 @@
+import os
+import glob
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import snapshot_store
+
+# === SETTINGS ===
+# Only 1-minute candles are stored ({symbol}_minute_{from}_{to}.csv, the
+# broker's historical export format); every other timeframe is built from them.
+OHLC_DIR = os.path.join(snapshot_store.DATA_DIR, "ohlc")
+CACHE_SIZE = 64
+SESSION_OPEN_MINUTE = 9 * 60 + 15   # bars are anchored at 09:15 like the broker's own candles
+TZ_SUFFIX = "+05:30"
+
+TIMEFRAMES = {"1m": 1, "3m": 3, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "day": 1440}
+FIELDS = ["open", "high", "low", "close", "volume", "oi"]
+CSV_COLUMNS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume", "oi": "OI"}
+
+
+class MinuteBars:
+    """
+    Columnar 1-minute candles for one symbol: minute timestamps (int64 minutes
+    since epoch, exchange local time) plus one float array per field.
+    """
+    def __init__(self, minute=None, values=None):
+        self.minute = np.empty(0, dtype=np.int64) if minute is None else minute
+        self.values = {f: np.empty(0, dtype=np.float64) for f in FIELDS} if values is None else values
+
+    def __len__(self):
+        return len(self.minute)
+
+    def copy(self):
+        return MinuteBars(self.minute.copy(), {f: v.copy() for f, v in self.values.items()})
+
+    @classmethod
+    def from_frame(cls, df):
+        # "2025-09-01 09:15:00+05:30" -> local wall-clock minute
+        ts = pd.to_datetime(df["datetime"].astype(str).str.slice(0, 19), format="%Y-%m-%d %H:%M:%S")
+        minute = ts.values.astype("datetime64[m]").astype(np.int64)
+        values = {f: df[CSV_COLUMNS[f]].to_numpy(dtype=np.float64) for f in FIELDS}
+        order = np.argsort(minute, kind="stable")
+        minute, keep = np.unique(minute[order], return_index=True)
+        return cls(minute, {f: v[order][keep] for f, v in values.items()})
+
+    def append(self, other):
+        """
+        Add bars newer than the last stored one. Returns the number added.
+        """
+        if len(self):
+            mask = other.minute > self.minute[-1]
+        else:
+            mask = np.ones(len(other), dtype=bool)
+        if not mask.any():
+            return 0
+        self.minute = np.concatenate([self.minute, other.minute[mask]])
+        for f in FIELDS:
+            self.values[f] = np.concatenate([self.values[f], other.values[f][mask]])
+        return int(mask.sum())
+
+    def slice(self, start=None, end=None):
+        lo = 0 if start is None else np.searchsorted(self.minute, start, side="left")
+        hi = len(self.minute) if end is None else np.searchsorted(self.minute, end, side="right")
+        return MinuteBars(self.minute[lo:hi], {f: v[lo:hi] for f, v in self.values.items()})
+
+
+def bucket_start(minute, tf_minutes):
+    """
+    Start minute of the tf_minutes bar each minute falls into, counted from the
+    09:15 session open (day bars start at midnight).
+    """
+    day = (minute // 1440) * 1440
+    if tf_minutes >= 1440:
+        return day
+    offset = minute - day - SESSION_OPEN_MINUTE
+    return day + SESSION_OPEN_MINUTE + (offset // tf_minutes) * tf_minutes
+
+
+def resample(bars, tf_minutes):
+    """
+    Aggregate 1-minute bars into tf_minutes bars with reduceat over bucket boundaries.
+    """
+    if tf_minutes == 1 or len(bars) == 0:
+        return MinuteBars(bars.minute.copy(), {f: v.copy() for f, v in bars.values.items()})
+    buckets = bucket_start(bars.minute, tf_minutes)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    v = bars.values
+    return MinuteBars(buckets[starts], {
+        "open": v["open"][starts],
+        "high": np.maximum.reduceat(v["high"], starts),
+        "low": np.minimum.reduceat(v["low"], starts),
+        "close": v["close"][ends],
+        "volume": np.add.reduceat(v["volume"], starts),
+        "oi": v["oi"][ends],
+    })
+
+
+def to_frame(bars):
+    ts = pd.to_datetime(bars.minute.astype("datetime64[m]")).strftime("%Y-%m-%d %H:%M:%S") + TZ_SUFFIX
+    df = pd.DataFrame({"datetime": ts})
+    for f in FIELDS:
+        df[CSV_COLUMNS[f]] = bars.values[f]
+    return df
+
+
+def to_dicts(bars):
+    """
+    Bars as JSON-ready dicts ({time: 'YYYY-mm-dd HH:MM', open, high, low, close, volume, oi}).
+    """
+    times = pd.to_datetime(bars.minute.astype("datetime64[m]")).strftime("%Y-%m-%d %H:%M")
+    columns = [bars.values[f].tolist() for f in FIELDS]
+    return [dict(zip(["time"] + FIELDS, row)) for row in zip(times, *columns)]
+
+
+def parse_minute(value, end=False):
+    """
+    'YYYY-mm-dd' or 'YYYY-mm-dd HH:MM' -> int minute, None passes through.
+    With end=True a bare date means the last minute of that day, so an
+    inclusive end date keeps the whole day.
+    """
+    if not value:
+        return None
+    ts = pd.Timestamp(value)
+    minute = int(np.datetime64(ts.to_datetime64(), "m").astype(np.int64))
+    if end and len(value.strip()) <= len("YYYY-mm-dd"):
+        minute += 24 * 60 - 1
+    return minute
+
+
+class OHLCEngine:
+    """
+    Serves any timeframe for a symbol from its stored 1-minute candles.
+    Resampled results are kept in a bounded LRU cache keyed by
+    (symbol, timeframe, start, end). When new minutes arrive, cached
+    open-ended results only have their last (still open) bar updated, or a
+    new bar appended, instead of being rebuilt.
+    """
+    def __init__(self, directory=OHLC_DIR, cache_size=CACHE_SIZE):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.minutes = {}
+        self.sources = {}
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _source_files(self, symbol):
+        # {symbol}_minute_{from}_{to}.csv only, not derived files like *_IndicatorSentiments.csv
+        paths = glob.glob(os.path.join(self.directory, f"{symbol}_minute_*_*.csv"))
+        return sorted(p for p in paths if len(os.path.basename(p)[:-4].split("_")) == 4)
+
+    def _load(self, symbol):
+        """
+        Pick up new or grown minute files; new minutes go through add_minutes().
+        """
+        files = self._source_files(symbol)
+        signature = tuple((p, os.path.getmtime(p), os.path.getsize(p)) for p in files)
+        if self.sources.get(symbol) == signature:
+            return
+        frames = [pd.read_csv(p) for p in files]
+        fresh = MinuteBars.from_frame(pd.concat(frames, ignore_index=True)) if frames else MinuteBars()
+        current = self.minutes.get(symbol)
+        self.sources[symbol] = signature
+        if current is None or (len(fresh) and len(current) and fresh.minute[0] < current.minute[0]):
+            self.minutes[symbol] = fresh
+            self._invalidate(symbol)
+        else:
+            self._add_locked(symbol, fresh)
+
+    def _invalidate(self, symbol):
+        for key in [k for k in self.cache if k[0] == symbol]:
+            del self.cache[key]
+
+    def add_minutes(self, symbol, bars):
+        """
+        Append new 1-minute bars and roll them into the cached higher timeframes.
+        """
+        with self.lock:
+            return self._add_locked(symbol, bars)
+
+    def _add_locked(self, symbol, bars):
+        store = self.minutes.setdefault(symbol, MinuteBars())
+        before = len(store)
+        added = store.append(bars)
+        if not added:
+            return 0
+        new = store.slice(start=int(store.minute[before]))
+        for key in [k for k in self.cache if k[0] == symbol]:
+            _, timeframe, start, end = key
+            if end is not None and end < new.minute[0]:
+                continue   # closed range, unaffected
+            if end is not None:
+                del self.cache[key]
+                continue
+            self.cache[key] = self._roll_forward(self.cache[key], new.slice(start=start), TIMEFRAMES[timeframe])
+        return added
+
+    @staticmethod
+    def _roll_forward(result, new, tf_minutes):
+        """
+        Merge new minutes into a resampled result: only bars from the last
+        (open) one onwards change. Returns a new MinuteBars; `result` may
+        still be read by a request that got it from get().
+        """
+        if len(new) == 0:
+            return result
+        fresh = resample(new, tf_minutes)
+        result = result.copy()
+        if len(result) and fresh.minute[0] == result.minute[-1]:
+            v, f = result.values, fresh.values
+            v["high"][-1] = max(v["high"][-1], f["high"][0])
+            v["low"][-1] = min(v["low"][-1], f["low"][0])
+            v["close"][-1] = f["close"][0]
+            v["volume"][-1] += f["volume"][0]
+            v["oi"][-1] = f["oi"][0]
+            fresh = fresh.slice(start=fresh.minute[0] + 1)
+        result.append(fresh)
+        return result
+
+    def get(self, symbol, timeframe, start=None, end=None):
+        """
+        Bars for symbol at `timeframe` (a TIMEFRAMES key) between the start and
+        end minutes (inclusive, None = open-ended). Returns a MinuteBars copy
+        the caller can read after the lock is released.
+        """
+        if timeframe not in TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe {timeframe!r}, expected one of {list(TIMEFRAMES)}")
+        key = (symbol, timeframe, start, end)
+        with self.lock:
+            self._load(symbol)
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key].copy()
+            self.misses += 1
+            bars = self.minutes.get(symbol, MinuteBars())
+            result = resample(bars.slice(start, end), TIMEFRAMES[timeframe])
+            self.cache[key] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return result.copy()
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = OHLCEngine()
+    return _engine
+
+
+def verify_against(minute_csv, resampled_csv, timeframe):
+    """
+    Compare resample() of a 1-minute file with a broker-supplied higher
+    timeframe file over their common range. Returns the number of mismatched bars.
+    """
+    bars = MinuteBars.from_frame(pd.read_csv(minute_csv))
+    expected = MinuteBars.from_frame(pd.read_csv(resampled_csv))
+    ours = resample(bars, TIMEFRAMES[timeframe])
+    common, a, b = np.intersect1d(ours.minute, expected.minute, return_indices=True)
+    mismatched = np.zeros(len(common), dtype=bool)
+    for f in ["open", "high", "low", "close"]:
+        mismatched |= ~np.isclose(ours.values[f][a], expected.values[f][b])
+    print(f"{timeframe}: {len(common)} bars compared, {int(mismatched.sum())} mismatched")
+    return int(mismatched.sum())
+
+
+if __name__ == "__main__":
+    import sys
+    # python ohlc_resampler.py <minute.csv> <tf>=<file.csv> ...
+    minute_csv = sys.argv[1]
+    for arg in sys.argv[2:]:
+        tf, path = arg.split("=", 1)
+        verify_against(minute_csv, path, tf)
@@ -0,0 +1,126 @@
+import os
+import gzip
+import json
+import queue
+import logging
+import threading
+from datetime import datetime
+
+# === SETTINGS ===
+CAPTURE_DIR = "backend/data/captures"
+MAX_FILE_BYTES = 64 * 1024 * 1024   # roll over to a new part after this many (uncompressed) bytes
+QUEUE_SIZE = 1000                   # payloads beyond this are dropped, never blocking the fetch
+
+
+class PayloadCapture:
+    """
+    Records raw upstream payloads as compact JSON lines from a background thread.
+    Files are named {kind}_{YYYY-MM-DD}_{part}.jsonl(.gz) and can be read back
+    with iter_captures() for replays and backtests.
+    """
+    def __init__(self, directory=CAPTURE_DIR, compress=True, max_bytes=MAX_FILE_BYTES):
+        self.directory = directory
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="payload-capture", daemon=True)
+        self._thread.start()
+
+    def put(self, kind, key, payload):
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "kind": kind, "key": key, "payload": payload}
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _path(self, kind, date_str, part):
+        ext = ".jsonl.gz" if self.compress else ".jsonl"
+        return os.path.join(self.directory, f"{kind}_{date_str}_{part:03d}{ext}")
+
+    def _open(self, kind, date_str):
+        part = 0
+        while os.path.exists(self._path(kind, date_str, part + 1)):
+            part += 1
+        path = self._path(kind, date_str, part)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size >= self.max_bytes:
+            part += 1
+            path, size = self._path(kind, date_str, part), 0
+        handle = gzip.open(path, "at", encoding="utf-8") if self.compress else open(path, "a", encoding="utf-8")
+        return {"date": date_str, "part": part, "handle": handle, "bytes": size}
+
+    def _write(self, record):
+        kind = record["kind"]
+        date_str = record["ts"][:10]
+        current = self._files.get(kind)
+        if current and (current["date"] != date_str or current["bytes"] >= self.max_bytes):
+            current["handle"].close()
+            current = None
+        if current is None:
+            current = self._open(kind, date_str)
+            self._files[kind] = current
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        current["handle"].write(line)
+        current["bytes"] += len(line)
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                self._write(record)
+                if self.queue.empty():
+                    for current in self._files.values():
+                        current["handle"].flush()
+            except Exception as e:
+                logging.error(f"[Capture] Error writing {record.get('kind')}: {e}")
+        for current in self._files.values():
+            current["handle"].close()
+        self._files.clear()
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join(timeout=10)
+        if self.dropped:
+            logging.warning(f"[Capture] Dropped {self.dropped} payloads (queue full)")
+
+
+_capture = None
+
+
+def enable(directory=CAPTURE_DIR, compress=True, max_bytes=MAX_FILE_BYTES):
+    global _capture
+    if _capture is None:
+        _capture = PayloadCapture(directory, compress, max_bytes)
+        logging.info(f"[Capture] Recording raw payloads to {directory}")
+    return _capture
+
+
+def disable():
+    global _capture
+    if _capture is not None:
+        _capture.close()
+        _capture = None
+
+
+def capture(kind, key, payload):
+    """
+    Queue a payload for recording. A no-op unless enable() was called.
+    """
+    if _capture is not None:
+        _capture.put(kind, key, payload)
+
+
+def iter_captures(path):
+    """
+    Yield the recorded {ts, kind, key, payload} dicts from one capture file.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,337 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# === SETTINGS ===
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DATA_DIR = os.path.join(BACKEND_DIR, "data")     # captures, tokens.csv and stored snapshots are read here
+CAPTURE_DIR = os.path.join(SOURCE_DATA_DIR, "captures")
+REPLAY_DIR = os.path.join(SOURCE_DATA_DIR, "replays")
+SESSION_OPEN = (9, 15)
+SESSION_CLOSE = (15, 30)
+FETCH_SECOND = 20           # same slots as the live workers
+SENTIMENT_SECOND = 25
+REPLAY_BUS_PORT = 5155      # replay events never reach a live dashboard on live_bus.BUS_PORT
+COOKIE_STRING = "access_token=replay"
+
+
+def session_minutes(date_str):
+    day = datetime.strptime(date_str, "%Y-%m-%d")
+    minute = day.replace(hour=SESSION_OPEN[0], minute=SESSION_OPEN[1])
+    close = day.replace(hour=SESSION_CLOSE[0], minute=SESSION_CLOSE[1])
+    minutes = []
+    while minute <= close:
+        minutes.append(minute)
+        minute += timedelta(minutes=1)
+    return minutes
+
+
+def prepare_workspace(output_dir, force=False):
+    """
+    Fresh output tree (<output>/backend/data) that the collector and API use as
+    their data directory. Must run before the backend modules are imported.
+    """
+    data_dir = os.path.join(output_dir, "backend", "data")
+    if os.path.isdir(data_dir) and os.listdir(data_dir):
+        if not force:
+            raise SystemExit(f"⚠️ {data_dir} is not empty (use --force to replace it)")
+        shutil.rmtree(data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["DASHBOARD_DATA_DIR"] = data_dir
+    os.chdir(output_dir)   # main.py and OIBasedSentiments write to backend/data relative to the cwd
+    return data_dir
+
+
+# === SOURCES ===
+class CaptureSource:
+    """
+    Recorded upstream payloads behind the local stub: every minute runs the
+    real fetchers and main.collect_cycle for each symbol, plus the index
+    breadth tick, exactly as the live workers would.
+    """
+    def __init__(self, capture_dir, tokens_csv, replay_clock):
+        import stub_server
+        self.stub_server = stub_server
+        self.payloads = stub_server.UpstreamPayloads(clock=replay_clock)
+        self.count = self.payloads.load(capture_dir) if capture_dir and os.path.isdir(capture_dir) else 0
+        if "live_derivative_prices" not in self.payloads.recorded:
+            tokens_csv = stub_server.write_tokens_csv(os.path.join(os.environ["DASHBOARD_DATA_DIR"], "tokens.csv"))
+        elif not tokens_csv or not os.path.exists(tokens_csv):
+            raise SystemExit("⚠️ Recorded option chains need the tokens.csv they were captured with (--tokens)")
+        os.environ["TOKENS_CSV"] = tokens_csv
+        self.stub = None
+        self.pool = None
+
+    def dates(self):
+        return self.payloads.recorded_dates()
+
+    def symbols_and_expiries(self):
+        expiries = {}
+        for kind in ("oi_change_chart", "straddle"):
+            for key in self.payloads.recorded.get(kind, {}):
+                symbol, _, expiry = key.rpartition("_")
+                expiries.setdefault(symbol, set()).add(expiry)
+        for symbol in self.payloads.recorded.get("live_derivative_prices", {}):
+            expiries.setdefault(symbol, set())
+        if not expiries:
+            return {symbol: market["expiries"] for symbol, market in self.stub_server.MARKETS.items()}
+        return {symbol: sorted(e) or self.stub_server.MARKETS.get(symbol, {}).get("expiries", [])
+                for symbol, e in sorted(expiries.items())}
+
+    def start(self):
+        import http_pool
+        self.stub = self.stub_server.start(self.payloads)
+        http_pool.redirect_hosts(self.stub.base_url, self.stub_server.UPSTREAM_HOSTS)
+        import main
+        from StockChangeFetch import fetch_and_save_index_prices
+        self.main = main
+        self.fetch_breadth = fetch_and_save_index_prices
+        self.jobs = self.symbols_and_expiries()
+        self.pool = ThreadPoolExecutor(max_workers=len(self.jobs) + 1, thread_name_prefix="replay-worker")
+
+    def minute(self, now):
+        # The symbol workers and the index worker run side by side, as in main.py
+        futures = [self.pool.submit(self.main.collect_cycle, symbol, expiries, now)
+                   for symbol, expiries in self.jobs.items()]
+        futures.append(self.pool.submit(self.fetch_breadth, COOKIE_STRING))
+        for future in futures:
+            future.result()
+
+    def stop(self):
+        import http_pool
+        if self.pool:
+            self.pool.shutdown()
+        if self.stub:
+            self.stub.shutdown()
+        http_pool.clear_redirects()
+
+
+class RecordSource:
+    """
+    Snapshot records appended minute by minute as the worker would: from the
+    snapshot store of a past day, or from bundled OHLC CSVs (Close as LTP, see
+    OIBasedSentiments.load_ohlc_as_snapshots).
+    """
+    def __init__(self, records):
+        self.records = records     # symbol -> DataFrame with ts, expiry, ltp, net_oi_chg
+        # Nothing is fetched, but main still loads a token map on import
+        import stub_server
+        os.environ["TOKENS_CSV"] = stub_server.write_tokens_csv(
+            os.path.join(os.environ["DASHBOARD_DATA_DIR"], "tokens.csv"))
+
+    @classmethod
+    def from_store(cls, date_str, symbols, data_dir=SOURCE_DATA_DIR):
+        import snapshot_store
+        records = {}
+        for symbol in symbols:
+            recs = snapshot_store.read(symbol, date_str, data_dir=data_dir)
+            if len(recs):
+                frame = pd.DataFrame({name: recs[name] for name in recs.dtype.names})
+                frame["expiry"] = frame["expiry"].astype(str)
+                records[symbol] = frame
+        return cls(records)
+
+    @classmethod
+    def from_csv(cls, paths):
+        from OIBasedSentiments import load_ohlc_as_snapshots
+        from sensibull_greeks_fetcher import SensibullFetcher
+        token_symbols = {token: symbol for symbol, token in SensibullFetcher.SYMBOL_TO_TOKEN.items()}
+        records = {}
+        for path in paths:
+            token = os.path.basename(path).split("_")[0]
+            df = load_ohlc_as_snapshots(path)
+            ts = pd.to_datetime(df["timestamp"].str[:19], format="%Y-%m-%d %H:%M:%S")
+            frame = pd.DataFrame({"ts": ts, "expiry": "", "ltp": df["ltp"], "net_oi_chg": df["net_oi_change"]})
+            symbol = token_symbols.get(token, token)
+            records[symbol] = pd.concat([records[symbol], frame]) if symbol in records else frame
+        return cls(records)
+
+    def dates(self):
+        return sorted({ts.strftime("%Y-%m-%d") for frame in self.records.values() for ts in frame["ts"]})
+
+    def start(self):
+        import snapshot_store
+        import file_writer
+        self.snapshot_store = snapshot_store
+        self.writer = file_writer.get_writer()
+        self.by_minute = {
+            symbol: {ts.to_pydatetime(): rows for ts, rows in frame.groupby(frame["ts"].dt.floor("min"))}
+            for symbol, frame in self.records.items()
+        }
+
+    def minute(self, now):
+        for symbol, minutes in self.by_minute.items():
+            rows = minutes.get(now)
+            if rows is None:
+                continue
+            self.snapshot_store.append(symbol, [
+                {**row, "ts": row["ts"].to_pydatetime(), "symbol": symbol} for row in rows.to_dict("records")
+            ], writer=self.writer)
+
+    def stop(self):
+        pass
+
+
+# === REPLAY ===
+def fingerprint(data_dir):
+    """
+    sha1 over every output file (name and content): equal for equal replays.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(data_dir, "**", "*"), recursive=True)):
+        if os.path.isfile(path) and not path.endswith(".json"):
+            digest.update(os.path.relpath(path, data_dir).encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def replay_day(source, date_str, speed=0.0, serve_port=None):
+    """
+    Drive `source` through one session on a virtual clock: each minute the
+    source produces the xx:xx:20 snapshots, then the sentiment step runs at
+    xx:xx:25. speed=0 runs as fast as possible, otherwise `speed` virtual
+    minutes pass per real minute. Returns a summary dict.
+    """
+    import clock
+    import live_bus
+    live_bus.BUS_PORT = REPLAY_BUS_PORT
+    minutes = session_minutes(date_str)
+    replay_clock = clock.VirtualClock(minutes[0])
+    clock.use(replay_clock)
+    if isinstance(source, CaptureSource):
+        source.payloads.clock = replay_clock
+
+    source.start()
+    import main
+    import file_writer
+    from Server import app
+    server = None
+    if serve_port:
+        from werkzeug.serving import make_server
+        live_bus.start_listener(port=REPLAY_BUS_PORT)
+        server = make_server("127.0.0.1", serve_port, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="replay-api", daemon=True).start()
+        print(f"🚀 Replay API on http://127.0.0.1:{serve_port}")
+
+    sentiment_rows = 0
+    started = time.perf_counter()
+    try:
+        for i, minute in enumerate(minutes):
+            if speed:
+                delay = started + i * 60.0 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            replay_clock.set(minute.replace(second=FETCH_SECOND))
+            source.minute(minute)
+            file_writer.get_writer().flush()
+            replay_clock.set(minute.replace(second=SENTIMENT_SECOND))
+            sentiment_rows += sum(len(rows) for rows in (main.sentiment_cycle() or {}).values())
+    finally:
+        source.stop()
+        file_writer.get_writer().flush()
+    wall = time.perf_counter() - started
+
+    client = app.test_client()
+    snapshots = client.get("/api/snapshots").get_json() or {}
+    chart = client.get("/api/chartdata").get_json() or {}
+    summary = {
+        "date": date_str,
+        "minutes": len(minutes),
+        "wall_seconds": round(wall, 3),
+        "minutes_per_second": round(len(minutes) / wall, 1) if wall else None,
+        "speedup": round(len(minutes) * 60 / wall, 1) if wall else None,
+        "sentiment_rows": sentiment_rows,
+        "api_snapshot_rows": {k: len(v) for k, v in snapshots.items() if isinstance(v, list)},
+        "api_chart_points": {k: len(v) for k, v in chart.items() if isinstance(v, list)},
+        "fingerprint": fingerprint(os.environ["DASHBOARD_DATA_DIR"]),
+    }
+    # The replay only proves something if the API serves what the pipeline wrote
+    summary["problems"] = []
+    if sentiment_rows and not sum(summary["api_chart_points"].values()):
+        summary["problems"].append(f"{sentiment_rows} sentiment rows written but /api/chartdata returned no points")
+    return summary, server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a trading day through the collector, sentiment and API code")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument("--captures", default=None,
+                              help=f"payload_capture directory (default {CAPTURE_DIR}; synthetic payloads if empty)")
+    source_group.add_argument("--store", action="store_true", help="replay stored snapshot records of --date")
+    source_group.add_argument("--csv", nargs="+", help="replay bundled 1-minute OHLC CSVs")
+    parser.add_argument("--date", help="session to replay, YYYY-MM-DD (default: the last one in the source)")
+    parser.add_argument("--symbols", nargs="+", default=["NIFTY", "BANKNIFTY", "SENSEX"], help="with --store")
+    parser.add_argument("--tokens", default=os.path.join(SOURCE_DATA_DIR, "tokens.csv"),
+                        help="token map the captures were recorded with")
+    parser.add_argument("--speed", type=float, default=0.0, help="virtual minutes per real minute; 0 = flat out")
+    parser.add_argument("--output", help=f"output directory (default {REPLAY_DIR}/<date>)")
+    parser.add_argument("--force", action="store_true", help="replace an existing output directory")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="also serve the API on this port while replaying")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    csv_paths = [os.path.abspath(p) for p in args.csv] if args.csv else None
+    capture_dir = os.path.abspath(args.captures or CAPTURE_DIR)
+    tokens_csv = os.path.abspath(args.tokens) if args.tokens else None
+
+    # The source's dates decide the default output directory, so peek at them first
+    if args.store:
+        if not args.date:
+            raise SystemExit("⚠️ --store needs --date")
+        date_str = args.date
+    elif csv_paths:
+        days = {day for path in csv_paths for day in pd.read_csv(path, usecols=["datetime"])["datetime"].str[:10]}
+        date_str = args.date or max(days)
+    else:
+        import stub_server
+        recorded = stub_server.UpstreamPayloads(capture_dir if os.path.isdir(capture_dir) else None).recorded_dates()
+        date_str = args.date or (recorded[-1] if recorded else datetime.now().strftime("%Y-%m-%d"))
+    output_dir = os.path.abspath(args.output or os.path.join(REPLAY_DIR, date_str))
+
+    os.makedirs(output_dir, exist_ok=True)
+    prepare_workspace(output_dir, args.force)
+    if args.store:
+        source = RecordSource.from_store(date_str, args.symbols)
+    elif csv_paths:
+        source = RecordSource.from_csv(csv_paths)
+    else:
+        source = CaptureSource(capture_dir, tokens_csv, None)
+        print(f"📼 {source.count} recorded payloads" if source.count else "📼 No recordings, using synthetic payloads")
+    import main   # after the source: it sets TOKENS_CSV, and main configures logging
+    import clock
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    print(f"⏩ Replaying {date_str} into {output_dir}")
+
+    summary, server = replay_day(source, date_str, args.speed, args.serve)
+    with open(os.path.join(output_dir, "replay_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"✅ {summary['minutes']} minutes in {summary['wall_seconds']:.1f}s "
+          f"({summary['speedup']:.0f}x real time), {summary['sentiment_rows']} sentiment rows")
+    print(f"   API snapshot rows: {summary['api_snapshot_rows']}  fingerprint {summary['fingerprint'][:12]}")
+    for problem in summary["problems"]:
+        print(f"❌ {problem}")
+
+    if server:
+        print("🔁 Replay finished; API still serving (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+    import file_writer
+    file_writer.close_writer()
+    clock.use(None)
+    if summary["problems"]:
+        sys.exit(1)
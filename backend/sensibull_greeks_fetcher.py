@@ -1,38 +1,105 @@
-import requests
 import pandas as pd
 import urllib3
-from datetime import datetime, timedelta
+import os
+import logging
+import threading
+import http_pool
+import payload_capture
+import metrics
+import clock
+from collections import deque
+from datetime import timedelta
 
 # Disable SSL warnings (only for dev; remove in prod)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+GREEK_COLUMNS = ["theta", "vega", "delta", "gamma"]
+VIX_CANDLE_HISTORY = 2 * 375  # two sessions of 1-minute candles
+
+
+def _to_numeric(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+
 
 class IndiaVIXFetcher:
     """
     Fetches latest India VIX close price.
+
+    The close is cached process-wide in time buckets of `ttl_seconds`, so every
+    worker asking within the same bucket shares one request. Concurrent callers
+    wait on the request already in flight instead of sending their own.
     """
-    def __init__(self, cookie_string: str):
+    _cache_lock = threading.Lock()
+    _cached_close = None
+    _cached_bucket = None
+    _inflight = None
+
+    def __init__(self, cookie_string: str, ttl_seconds: int = 60, incremental: bool = True):
         self.url = "https://oxide.sensibull.com/v1/compute/candles/INDIAVIX"
         self.cookies = dict(x.strip().split("=", 1) for x in cookie_string.split("; "))
+        self.ttl_seconds = ttl_seconds
+        self.incremental = incremental
+        self.candles = deque(maxlen=VIX_CANDLE_HISTORY)
+        self.last_ts = None
 
     def fetch_latest_close(self):
-        # Automatically set from_date = yesterday, to_date = today in YYYY-MM-DD format
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=1)
+        cls = IndiaVIXFetcher
+        bucket = int(clock.time() // self.ttl_seconds)
+        with cls._cache_lock:
+            if cls._cached_bucket == bucket:
+                return cls._cached_close
+            inflight = cls._inflight
+            if inflight is None:
+                inflight = cls._inflight = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            inflight.wait(timeout=15)
+            with cls._cache_lock:
+                return cls._cached_close if cls._cached_bucket == bucket else None
+
+        latest_close = None
+        try:
+            latest_close = self._fetch_close()
+        finally:
+            with cls._cache_lock:
+                if latest_close is not None:
+                    cls._cached_close = latest_close
+                    cls._cached_bucket = bucket
+                cls._inflight = None
+            inflight.set()
+        return latest_close
+
+    def _fetch_close(self):
+        # Full mode asks for yesterday + today. Incremental mode narrows the
+        # window to the day of the last candle seen and keeps only newer candles.
+        today = clock.now().date()
+        from_date = today - timedelta(days=1)
+        if self.incremental and self.last_ts and self.last_ts[:10] == today.strftime("%Y-%m-%d"):
+            from_date = today
 
         payload = {
-            "from_date": yesterday.strftime("%Y-%m-%d"),
+            "from_date": from_date.strftime("%Y-%m-%d"),
             "to_date": today.strftime("%Y-%m-%d"),
             "interval": "1M",
             "skip_last_ts": False
         }
         try:
-            response = requests.post(self.url, json=payload, cookies=self.cookies, timeout=10, verify=False)
+            response = http_pool.post(self.url, json=payload, cookies=self.cookies, timeout=10, verify=False)
             response.raise_for_status()
             raw = response.json()
+            payload_capture.capture("candles_INDIAVIX", payload["from_date"], raw)
             #print(raw)
             candles = raw.get('payload', {}).get('candles', [])
             #print(f"candles:{candles}")
+            if self.incremental:
+                new_candles = [c for c in candles if self.last_ts is None or str(c.get('ts')) > self.last_ts]
+                self.candles.extend(new_candles)
+                if new_candles:
+                    self.last_ts = str(new_candles[-1].get('ts'))
+                candles = self.candles
             if candles:
                 latest_close = candles[-1].get('close')
                 return latest_close
@@ -61,10 +128,104 @@ class SensibullFetcher:
 
     def __init__(self, access_token: str, csv_path: str, cookie_string: str):
         self.access_token = access_token
-        self.token_map = pd.read_csv(csv_path)
-        self.token_map["INSTRUMENT_TOKEN"] = self.token_map["INSTRUMENT_TOKEN"].astype(str)
+        self.csv_path = csv_path
+        self._token_lock = threading.Lock()
+        self._token_mtime = None
+        self._pending_signature = None   # (mtime, size) of a smaller tokens.csv seen once
+        self.token_index = None
+        self.reload_token_map()
         self.vix_fetcher = IndiaVIXFetcher(cookie_string)  # add vix fetcher
 
+    def reload_token_map(self):
+        """
+        Reads tokens.csv and builds the token -> (strike, type, expiry) index.
+        The index is hashed on the integer instrument token so option lookups
+        are a single join instead of a DataFrame scan per option.
+
+        Once an index is loaded, a reload only replaces it with a good one:
+        tokens.csv may still be half-written when its mtime changes, so an
+        unreadable or empty file keeps the previous index, and a smaller one is
+        only taken once the file has stopped changing (same mtime and size on
+        two checks in a row).
+        """
+        with self._token_lock:
+            stat = os.stat(self.csv_path)
+            signature = (stat.st_mtime, stat.st_size)
+            try:
+                token_index = self._build_token_index(pd.read_csv(self.csv_path))
+            except Exception as e:
+                if self.token_index is None:
+                    raise
+                logging.warning(f"Could not reload {self.csv_path}, keeping {len(self.token_index)} tokens: {e}")
+                return
+            if self.token_index is not None:
+                if token_index.empty:
+                    logging.warning(f"{self.csv_path} has no instrument tokens, keeping the previous map")
+                    return
+                if len(token_index) < len(self.token_index) and signature != self._pending_signature:
+                    self._pending_signature = signature   # may still be being written; retry next cycle
+                    logging.warning(f"{self.csv_path} shrank from {len(self.token_index)} to {len(token_index)} "
+                                    f"tokens, keeping the previous map until the file settles")
+                    return
+            self.token_index = token_index
+            self._token_mtime = stat.st_mtime
+            self._pending_signature = None
+            logging.info(f"Loaded {len(self.token_index)} instrument tokens from {self.csv_path}")
+
+    def _reload_token_map_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.csv_path)
+        except OSError:
+            return
+        if mtime != self._token_mtime:
+            self.reload_token_map()
+
+    @staticmethod
+    def _build_token_index(token_map):
+        tokens = pd.to_numeric(token_map["INSTRUMENT_TOKEN"], errors="coerce")
+        index = pd.DataFrame({
+            "token": tokens,
+            "strike": pd.to_numeric(token_map["STRIKE"], errors="coerce"),
+            "type": token_map["INSTRUMENT_TYPE"],
+        })
+        if "EXPIRY" in token_map.columns:
+            index["expiry"] = token_map["EXPIRY"]
+        index = index.dropna(subset=["token", "strike"])
+        index = index.astype({"token": "int64", "strike": "int64"})
+        # First row wins for duplicate tokens, same as the old per-option lookup
+        index = index.drop_duplicates(subset="token", keep="first").set_index("token")
+        index["type"] = index["type"].astype("category")
+        if "expiry" in index.columns:
+            index["expiry"] = index["expiry"].astype("category")
+        return index
+
+    def _map_options(self, options):
+        """
+        Joins the raw option list against the token index in one vectorized step.
+        Returns a DataFrame with strike, type and greeks for every mapped option.
+        """
+        greeks = [opt.get("greeks_with_iv") or {} for opt in options]
+        chain = pd.DataFrame({"token": _to_numeric([opt.get("token") for opt in options])})
+        for col in GREEK_COLUMNS:
+            chain[col] = _to_numeric([g.get(col, 0) for g in greeks])
+        chain = chain.dropna(subset=["token"]).astype({"token": "int64"})
+        chain[GREEK_COLUMNS] = chain[GREEK_COLUMNS].fillna(0)
+        return chain.join(self.token_index, on="token", how="inner")
+
+    @staticmethod
+    def _strike_greeks(chain):
+        """
+        {"CE": {...}, "PE": {...}} of strike-sorted NumPy arrays, one per greek.
+        """
+        strike_greeks = {}
+        for option_type in ("CE", "PE"):
+            side = chain[chain["type"] == option_type]
+            side = side.drop_duplicates(subset="strike", keep="last").sort_values("strike")
+            strike_greeks[option_type] = {"strike": side["strike"].to_numpy()}
+            for col in GREEK_COLUMNS:
+                strike_greeks[option_type][col] = side[col].to_numpy()
+        return strike_greeks
+
     def fetch_vix_close(self):
         return self.vix_fetcher.fetch_latest_close()
 
@@ -76,9 +237,11 @@ class SensibullFetcher:
         cookies = {"access_token": self.access_token}
 
         try:
-            response = requests.get(url, cookies=cookies, timeout=10, verify=False)
+            self._reload_token_map_if_changed()
+            response = http_pool.get(url, cookies=cookies, timeout=10, verify=False)
             response.raise_for_status()
             raw = response.json()
+            payload_capture.capture("live_derivative_prices", symbol, raw)
             data = raw.get("data", {})
             #print(data)
             ltp = float(data.get("underlying_price", 0))
@@ -103,48 +266,31 @@ class SensibullFetcher:
                 put_strikes  = [atm - 8 * strike_step + i * strike_step for i in range(11)]
 
                 options = expiry_data.get("options", [])
-                rows = []
-                for opt in options:
-                    token_str = str(opt.get("token"))
-                    mapped = self.token_map[self.token_map["INSTRUMENT_TOKEN"] == token_str]
-                    if not mapped.empty:
-                        strike = mapped.iloc[0]["STRIKE"]
-                        option_type = mapped.iloc[0]["INSTRUMENT_TYPE"]
-                        greeks = opt.get("greeks_with_iv") or {}
-                        rows.append({
-                            "strike": int(strike),
-                            "type": option_type,
-                            "theta": greeks.get("theta", 0),
-                            "vega": greeks.get("vega", 0),
-                            "delta": greeks.get("delta", 0),
-                            "gamma": greeks.get("gamma", 0),
-                        })
-                #print(rows)
-                if not rows:
+                with metrics.timed("pipeline_stage_seconds", stage="token_mapping", symbol=symbol):
+                    chain = self._map_options(options) if options else None
+                if chain is None or chain.empty:
                     result["expiries"][expiry] = None
                     continue
 
-                df = pd.DataFrame(rows)
-                #print(df)
-
-                call_df = df[(df["type"] == "CE") & (df["strike"].isin(call_strikes))]
-                put_df  = df[(df["type"] == "PE") & (df["strike"].isin(put_strikes))]
-
-                stats = {
-                    "total_call_vega": float(call_df["vega"].sum()),
-                    "total_put_vega": float(put_df["vega"].sum()),
-                    "total_call_theta": float(call_df["theta"].sum()),
-                    "total_put_theta": float(put_df["theta"].sum()),
-                    "total_call_delta": float(call_df["delta"].sum()),
-                    "total_put_delta": float(put_df["delta"].sum()),
-                    "total_call_gamma": float(call_df["gamma"].sum()),
-                    "total_put_gamma": float(put_df["gamma"].sum()),
-                }
-                # For Net Delta Exposure
-                stats["per_strike_deltas"] = {
-                (row["strike"], row["type"]): row["delta"] for row in rows
-                }
-                #print(stats)
+                with metrics.timed("pipeline_stage_seconds", stage="aggregation", symbol=symbol):
+                    is_call = (chain["type"] == "CE") & chain["strike"].isin(call_strikes)
+                    is_put = (chain["type"] == "PE") & chain["strike"].isin(put_strikes)
+                    call_totals = chain.loc[is_call, GREEK_COLUMNS].sum()
+                    put_totals = chain.loc[is_put, GREEK_COLUMNS].sum()
+
+                    stats = {
+                        "total_call_vega": float(call_totals["vega"]),
+                        "total_put_vega": float(put_totals["vega"]),
+                        "total_call_theta": float(call_totals["theta"]),
+                        "total_put_theta": float(put_totals["theta"]),
+                        "total_call_delta": float(call_totals["delta"]),
+                        "total_put_delta": float(put_totals["delta"]),
+                        "total_call_gamma": float(call_totals["gamma"]),
+                        "total_put_gamma": float(put_totals["gamma"]),
+                    }
+                    # Per-strike greek columns for exposures (NET_DEX, GEX) against OI
+                    stats["strike_greeks"] = self._strike_greeks(chain)
+                    #print(stats)
                 result["expiries"][expiry] = stats
                 result["atm"] = atm
 
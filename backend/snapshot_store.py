@@ -0,0 +1,116 @@
+import os
+import math
+import threading
+from datetime import datetime
+import numpy as np
+
+# === SCHEMA ===
+# One fixed-size record per symbol, expiry and minute. Producers (main.worker)
+# and consumers (OIBasedSentiments, Server) share this dtype, so nothing is
+# parsed back out of text. Missing values are stored as NaN.
+NUMERIC_FIELDS = [
+    "ltp", "atm", "straddle", "ce", "pe", "net_oi_chg", "vix", "net_dex",
+    "delta_diff", "vega_diff", "theta_diff", "c_delta", "p_delta", "c_vega", "p_vega",
+    "c_theta", "p_theta", "c_oi", "p_oi", "c_chg_oi", "p_chg_oi",
+]
+SNAPSHOT_DTYPE = np.dtype(
+    [("ts", "M8[s]"), ("symbol", "U12"), ("expiry", "U10")] + [(name, "f8") for name in NUMERIC_FIELDS]
+)
+
+# DASHBOARD_DATA_DIR points the collector and API at another data directory (benchmarks, replays)
+DATA_DIR = os.environ.get("DASHBOARD_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+TIMESTAMP_FORMAT = "%d-%m-%Y %H:%M"
+
+_write_lock = threading.Lock()
+
+
+def store_path(symbol, date_str, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"snapshots_{symbol}_{date_str}.rec")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def to_records(rows):
+    """
+    Pack row dicts (keys from SNAPSHOT_DTYPE, ts as datetime) into a structured array.
+    """
+    records = np.zeros(len(rows), dtype=SNAPSHOT_DTYPE)
+    for i, row in enumerate(rows):
+        records[i] = (
+            np.datetime64(row["ts"].replace(microsecond=0), "s"),
+            row["symbol"],
+            row["expiry"],
+            *(_to_float(row.get(name)) for name in NUMERIC_FIELDS),
+        )
+    return records
+
+
+def append(symbol, rows, data_dir=DATA_DIR, writer=None):
+    """
+    Append one minute's rows for a symbol to that day's store file in a single write.
+    With a file_writer.DailyFileWriter the day's handle stays open between calls.
+    """
+    if not rows:
+        return
+    records = to_records(rows)
+    date_str = rows[0]["ts"].strftime("%Y-%m-%d")
+    if writer is not None:
+        writer.write_bytes(store_path(symbol, "{date}", data_dir), records.tobytes(), date_str=date_str)
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    with _write_lock:
+        with open(store_path(symbol, date_str, data_dir), "ab") as f:
+            f.write(records.tobytes())
+
+
+def open_day(symbol, date_str, data_dir=DATA_DIR):
+    """
+    Zero-copy, read-only view of every complete record in a day's file.
+    """
+    path = store_path(symbol, date_str, data_dir)
+    try:
+        count = os.path.getsize(path) // SNAPSHOT_DTYPE.itemsize
+    except OSError:
+        count = 0
+    if count == 0:
+        return np.empty(0, dtype=SNAPSHOT_DTYPE)
+    return np.memmap(path, dtype=SNAPSHOT_DTYPE, mode="r", shape=(count,))
+
+
+def read(symbol, date_str, expiry=None, start=None, end=None, offset=0, data_dir=DATA_DIR):
+    """
+    Records for one symbol and day, optionally from record `offset` onwards,
+    within [start, end] (datetimes) and for a single expiry. Time and offset
+    ranges are slices of the memmap; only the expiry filter copies.
+    """
+    records = open_day(symbol, date_str, data_dir)[offset:]
+    if start is not None:
+        records = records[np.searchsorted(records["ts"], np.datetime64(start, "s"), side="left"):]
+    if end is not None:
+        records = records[:np.searchsorted(records["ts"], np.datetime64(end, "s"), side="right")]
+    if expiry is not None:
+        records = records[records["expiry"] == expiry]
+    return records
+
+
+def format_ts(ts):
+    return ts.astype(datetime).strftime(TIMESTAMP_FORMAT)
+
+
+def to_dicts(records):
+    """
+    JSON-ready dicts (NaN -> None, ts -> 'dd-mm-YYYY HH:MM') for API responses.
+    """
+    out = []
+    for rec in records:
+        row = {"timestamp": format_ts(rec["ts"]), "symbol": str(rec["symbol"]), "expiry": str(rec["expiry"])}
+        for name in NUMERIC_FIELDS:
+            value = float(rec[name])
+            row[name] = None if math.isnan(value) else value
+        out.append(row)
+    return out
@@ -1,6 +1,7 @@
-import requests
 import urllib3
-import json
+import http_pool
+import payload_capture
+from strike_columns import StrikeColumns
 
 # Disable SSL warnings (only for dev; remove in prod)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -26,9 +27,10 @@ class StraddleOIFetcher:
     def fetch_latest_straddle(self, symbol, expiry):
         url = f"https://straddle-chart.financedeft.com/{symbol}_{expiry}.json"
         try:
-            resp = requests.get(url, timeout=10, verify=False)
+            resp = http_pool.get(url, timeout=10, verify=False)
             resp.raise_for_status()
             data = resp.json()
+            payload_capture.capture("straddle", f"{symbol}_{expiry}", data)
             price_list = data.get("price_list", [])
             if not price_list:
                 return None
@@ -59,32 +61,22 @@ class StraddleOIFetcher:
             "show_oi": True
         }
         try:
-            response = requests.post(
+            response = http_pool.post(
                 "https://oxide.sensibull.com/v1/compute/1/oi_graphs/oi_change_chart",
                 json=payload, cookies=self.cookies, headers=self.headers,
                 timeout=10, verify=False
             )
             response.raise_for_status()
             data = response.json()
-            #print(f"\n\n==== DEBUG OI for {symbol} {expiry} ====")
-            with open(f"debug_oi_{symbol}_{expiry}.json", "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            payload_capture.capture("oi_change_chart", f"{symbol}_{expiry}", data)
             per_strike = data.get('payload', {}).get('per_strike_data', {})
             if not per_strike:
                 return None
 
-            total_from_call = sum(oi.get('from_call_oi', 0) for oi in per_strike.values())
-            total_to_call   = sum(oi.get('to_call_oi', 0) for oi in per_strike.values())
-            total_from_put  = sum(oi.get('from_put_oi', 0) for oi in per_strike.values())
-            total_to_put    = sum(oi.get('to_put_oi', 0) for oi in per_strike.values())
-
-            return {
-                "call_oi": total_to_call,
-                "put_oi": total_to_put,
-                "change_call_oi": total_to_call - total_from_call,
-                "change_put_oi": total_to_put - total_from_put,
-                "per_strike": per_strike  # <-- new field
-            }
+            columns = StrikeColumns.from_payload(per_strike)
+            result = columns.totals()
+            result["columns"] = columns
+            return result
         except Exception as e:
             print(f"[Error] Fetching OI for {symbol} {expiry}: {e}")
             return None
@@ -0,0 +1,73 @@
+import numpy as np
+
+OI_FIELDS = ["from_call_oi", "to_call_oi", "from_put_oi", "to_put_oi"]
+
+
+class StrikeColumns:
+    """
+    Columnar view of one expiry's per-strike OI: a strike array and an aligned
+    (n, 4) OI matrix in OI_FIELDS order. Totals and exposures are reductions
+    over these arrays instead of loops over the payload dict.
+    """
+    def __init__(self, strike, oi):
+        self.strike = strike
+        self.oi = oi
+
+    @classmethod
+    def from_payload(cls, per_strike):
+        strikes, rows = [], []
+        for key, oi in per_strike.items():
+            try:
+                strikes.append(float(key))
+            except (TypeError, ValueError):
+                strikes.append(np.nan)  # still counted in totals, never matched to a greek
+            rows.append([oi.get(field) or 0 for field in OI_FIELDS])
+        return cls(np.array(strikes, dtype=np.float64), np.array(rows, dtype=np.int64).reshape(-1, len(OI_FIELDS)))
+
+    @property
+    def to_call_oi(self):
+        return self.oi[:, 1]
+
+    @property
+    def to_put_oi(self):
+        return self.oi[:, 3]
+
+    def totals(self):
+        from_call, to_call, from_put, to_put = self.oi.sum(axis=0).tolist()
+        return {
+            "call_oi": to_call,
+            "put_oi": to_put,
+            "change_call_oi": to_call - from_call,
+            "change_put_oi": to_put - from_put,
+        }
+
+    def align(self, strikes, values):
+        """
+        Values (keyed by the sorted `strikes` array) reindexed onto this OI's
+        strikes; strikes without a value get 0.
+        """
+        out = np.zeros(len(self.strike), dtype=np.float64)
+        if len(strikes) == 0 or len(self.strike) == 0:
+            return out
+        pos = np.minimum(np.searchsorted(strikes, self.strike), len(strikes) - 1)
+        hit = strikes[pos] == self.strike
+        out[hit] = np.asarray(values, dtype=np.float64)[pos[hit]]
+        return out
+
+    def exposure(self, call_greeks, put_greeks, greek):
+        """
+        Per-strike call and put exposure (greek x open interest) for any greek
+        present in the Sensibull strike_greeks columns.
+        """
+        call = self.align(call_greeks["strike"], call_greeks[greek]) * self.to_call_oi
+        put = self.align(put_greeks["strike"], put_greeks[greek]) * self.to_put_oi
+        return call, put
+
+    def net_dex(self, call_greeks, put_greeks):
+        call, put = self.exposure(call_greeks, put_greeks, "delta")
+        return float(call.sum() + put.sum())
+
+    def gex(self, call_greeks, put_greeks, spot):
+        # Dealer gamma exposure per 1% move: calls add, puts subtract
+        call, put = self.exposure(call_greeks, put_greeks, "gamma")
+        return float((call.sum() - put.sum()) * spot * spot * 0.01)
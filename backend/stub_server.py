@@ -0,0 +1,320 @@
+import os
+import glob
+import json
+import time
+import bisect
+import random
+import argparse
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+import payload_capture
+import clock
+
+# === SETTINGS ===
+# Hosts the collector talks to; http_pool.redirect_hosts() sends them here.
+UPSTREAM_HOSTS = ["oxide.sensibull.com", "straddle-chart.financedeft.com", "www.nseindia.com"]
+# Synthetic markets, used for any payload that has no recording
+MARKETS = {
+    "NIFTY": {"token": "256265", "spot": 24500.0, "step": 50, "expiries": ["2025-08-21"]},
+    "BANKNIFTY": {"token": "260105", "spot": 55500.0, "step": 100, "expiries": ["2025-08-28"]},
+    "SENSEX": {"token": "265", "spot": 80500.0, "step": 100, "expiries": ["2025-08-19"]},
+}
+INDEX_HISTORY_SPOT = {"NIFTY 50": 24500.0, "NIFTY BANK": 55500.0}
+CHAIN_STRIKES = 40      # strikes either side of ATM in a synthetic chain
+SEED = 7
+
+
+def option_token(symbol, expiry, strike, option_type):
+    """
+    Deterministic instrument token for a synthetic option; write_tokens_csv() emits the same map.
+    """
+    market = MARKETS[symbol]
+    base = (list(MARKETS).index(symbol) + 1) * 10_000_000 + market["expiries"].index(expiry) * 1_000_000
+    return base + int(strike // market["step"]) * 2 + (option_type == "PE")
+
+
+def chain_strikes(symbol):
+    market = MARKETS[symbol]
+    atm = round(market["spot"] / market["step"]) * market["step"]
+    return [atm + i * market["step"] for i in range(-CHAIN_STRIKES, CHAIN_STRIKES + 1)]
+
+
+def write_tokens_csv(path):
+    """
+    tokens.csv (INSTRUMENT_TOKEN, STRIKE, INSTRUMENT_TYPE, EXPIRY) for the synthetic chains.
+    """
+    rows = [
+        (option_token(symbol, expiry, strike, option_type), strike, option_type, expiry)
+        for symbol, market in MARKETS.items()
+        for expiry in market["expiries"]
+        for strike in chain_strikes(symbol)
+        for option_type in ("CE", "PE")
+    ]
+    pd.DataFrame(rows, columns=["INSTRUMENT_TOKEN", "STRIKE", "INSTRUMENT_TYPE", "EXPIRY"]).to_csv(path, index=False)
+    return path
+
+
+class UpstreamPayloads:
+    """
+    Responses for each upstream call. Recorded payloads (payload_capture files)
+    are replayed in order per (kind, key), wrapping around at the end, or with
+    a `clock` the latest one recorded up to the end of the clock's minute
+    (the collector records a cycle's payloads a moment after xx:xx:20). Calls without
+    a recording get a synthetic payload that moves a little on every request.
+    All of it is deterministic for a given recording and seed.
+    """
+    def __init__(self, capture_dir=None, seed=SEED, clock=None):
+        self.recorded = {}      # kind -> key -> {"ts": [iso times], "payloads": [...]}
+        self.calls = {}
+        self.seed = seed
+        self.clock = clock
+        self.lock = threading.Lock()
+        if capture_dir:
+            self.load(capture_dir)
+
+    def load(self, capture_dir):
+        paths = sorted(glob.glob(os.path.join(capture_dir, "*.jsonl")) + glob.glob(os.path.join(capture_dir, "*.jsonl.gz")))
+        for path in paths:
+            for record in payload_capture.iter_captures(path):
+                series = self.recorded.setdefault(record["kind"], {}).setdefault(record["key"], {"ts": [], "payloads": []})
+                series["ts"].append(record["ts"])
+                series["payloads"].append(record["payload"])
+        for by_key in self.recorded.values():
+            for key, series in by_key.items():
+                order = sorted(range(len(series["ts"])), key=series["ts"].__getitem__)
+                by_key[key] = {"ts": [series["ts"][i] for i in order], "payloads": [series["payloads"][i] for i in order]}
+        return sum(len(s["ts"]) for by_key in self.recorded.values() for s in by_key.values())
+
+    def recorded_dates(self):
+        return sorted({ts[:10] for by_key in self.recorded.values() for s in by_key.values() for ts in s["ts"]})
+
+    def _next_call(self, kind, key):
+        with self.lock:
+            n = self.calls.get((kind, key), 0)
+            self.calls[(kind, key)] = n + 1
+        return n
+
+    def get(self, kind, key, synthetic, *args):
+        n = self._next_call(kind, key)
+        by_key = self.recorded.get(kind, {})
+        series = by_key.get(key)
+        if series is None and kind in ("candles_INDIAVIX", "quotes_v2") and by_key:
+            series = next(iter(by_key.values()))   # recorded under a date / chunk key
+        if series:
+            if self.clock is None:
+                return series["payloads"][n % len(series["payloads"])]
+            cutoff = self.clock.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+            at = bisect.bisect_left(series["ts"], cutoff.isoformat(timespec="milliseconds"))
+            return series["payloads"][max(at - 1, 0)]
+        return synthetic(self._rng(kind, key, n), n, key, *args)
+
+    def _rng(self, kind, key, n):
+        return np.random.default_rng([self.seed, n, sum(map(ord, f"{kind}:{key}"))])
+
+    # === SYNTHETIC PAYLOADS ===
+    @staticmethod
+    def _spot(symbol, n):
+        market = MARKETS[symbol]
+        return market["spot"] * (1 + 0.002 * np.sin(n / 9.0) + 0.0005 * np.sin(n / 2.3))
+
+    def live_derivative_prices(self, rng, n, symbol):
+        market = MARKETS[symbol]
+        spot = self._spot(symbol, n)
+        atm = round(spot / market["step"]) * market["step"]
+        per_expiry = {}
+        for expiry in market["expiries"]:
+            options = []
+            for strike in chain_strikes(symbol):
+                moneyness = (strike - spot) / (market["step"] * 8)
+                call_delta = float(1 / (1 + np.exp(moneyness)))
+                gamma = float(np.exp(-moneyness ** 2) * 0.002)
+                for option_type, delta in (("CE", call_delta), ("PE", call_delta - 1)):
+                    options.append({
+                        "token": option_token(symbol, expiry, strike, option_type),
+                        "greeks_with_iv": {
+                            "delta": round(delta, 4), "gamma": round(gamma, 6),
+                            "theta": round(-gamma * 4000 * (1 + rng.normal(0, 0.02)), 4),
+                            "vega": round(gamma * 2500 * (1 + rng.normal(0, 0.02)), 4),
+                        },
+                    })
+            per_expiry[expiry] = {"atm_strike": atm, "options": options}
+        return {"success": True, "data": {"underlying_price": round(spot, 2), "per_expiry_data": per_expiry}}
+
+    def oi_change_chart(self, rng, n, key):
+        symbol = key.split("_")[0]
+        step = MARKETS[symbol]["step"]
+        atm = round(self._spot(symbol, n) / step) * step
+        per_strike = {}
+        for strike in chain_strikes(symbol)[CHAIN_STRIKES - 10:CHAIN_STRIKES + 11]:
+            base = int(200_000 * np.exp(-((strike - atm) / (step * 6)) ** 2)) + 10_000
+            call_drift, put_drift = rng.integers(-5_000, 5_000, size=2) + int(3_000 * np.sin(n / 11.0))
+            per_strike[str(strike)] = {
+                "from_call_oi": base, "to_call_oi": base + int(call_drift) + n * 40,
+                "from_put_oi": base, "to_put_oi": base + int(put_drift) + n * 35,
+            }
+        return {"success": True, "payload": {"per_strike_data": per_strike}}
+
+    def straddle(self, rng, n, key):
+        symbol = key.split("_")[0]
+        price = MARKETS[symbol]["spot"] * 0.006 * (1 - n * 0.0005)
+        start = clock.now().replace(hour=9, minute=15, second=0, microsecond=0)
+        price_list = []
+        for i in range(max(1, min(n + 1, 375))):
+            ce = price / 2 * (1 + 0.01 * np.sin(i / 7.0))
+            pe = price / 2 * (1 - 0.01 * np.sin(i / 7.0))
+            price_list.append({"time": (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S"),
+                               "price": round(ce + pe, 2), "ce_price": round(ce, 2), "pe_price": round(pe, 2)})
+        return {"price_list": price_list}
+
+    def candles_INDIAVIX(self, rng, n, key):
+        start = clock.now().replace(hour=9, minute=15, second=0, microsecond=0)
+        return {"success": True, "payload": {"candles": [
+            {"ts": (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S+05:30"),
+             "close": round(12.5 + 0.4 * np.sin(i / 30.0), 2)}
+            for i in range(min(n + 1, 375))
+        ]}}
+
+    def quotes_v2(self, rng, n, key, symbols):
+        # Seeded per symbol and minute: the chunks of one tick arrive in parallel, in any order
+        minute = int(clock.time() // 60)
+        changes = [np.random.default_rng([self.seed, minute, sum(map(ord, s))]).normal(0, 0.008) for s in symbols]
+        return {"success": True, "payload": {s: {"price_change": round(float(c), 5)} for s, c in zip(symbols, changes)}}
+
+    def indicesHistory(self, rng, n, symbol, from_date, to_date):
+        spot = INDEX_HISTORY_SPOT.get(symbol, 50_000.0)
+        days = pd.bdate_range(pd.to_datetime(from_date, format="%d-%m-%Y"), pd.to_datetime(to_date, format="%d-%m-%Y"))
+        # Seeded by date, so overlapping ranges agree on the bars they share
+        records = []
+        for day in days:
+            day_rng = np.random.default_rng([self.seed, day.toordinal()])
+            close = spot * (1 + 0.05 * np.sin(day.toordinal() / 40.0))
+            open_, high, low = close * (1 + day_rng.normal(0, 0.003)), close * 1.006, close * 0.994
+            records.append({"EOD_TIMESTAMP": day.strftime("%d-%b-%Y"), "EOD_OPEN_INDEX_VAL": round(open_, 2),
+                            "EOD_HIGH_INDEX_VAL": round(max(high, open_), 2),
+                            "EOD_LOW_INDEX_VAL": round(min(low, open_), 2), "EOD_CLOSE_INDEX_VAL": round(close, 2)})
+        return {"data": {"indexCloseOnlineRecords": records[::-1]}}   # NSE returns newest first
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real upstreams
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method):
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+        url = urlsplit(self.path)
+        host, _, path = url.path.lstrip("/").partition("/")
+        path = "/" + path
+        body = self._body() if method == "POST" else {}
+        payloads = server.payloads
+        with server.stats_lock:
+            server.requests += 1
+
+        if host == "oxide.sensibull.com":
+            if path.startswith("/v1/compute/cache/live_derivative_prices/"):
+                token = path.rsplit("/", 1)[-1]
+                symbol = next((s for s, m in MARKETS.items() if m["token"] == token), None)
+                if symbol is None:
+                    return self._send(404, {"success": False})
+                return self._send(200, payloads.get("live_derivative_prices", symbol, payloads.live_derivative_prices))
+            if path == "/v1/compute/1/oi_graphs/oi_change_chart":
+                key = f"{body.get('underlying')}_{next(iter(body.get('expiries') or {}), '')}"
+                if body.get("underlying") not in MARKETS:
+                    return self._send(404, {"success": False})
+                return self._send(200, payloads.get("oi_change_chart", key, payloads.oi_change_chart))
+            if path == "/v1/compute/candles/INDIAVIX":
+                return self._send(200, payloads.get("candles_INDIAVIX", body.get("from_date"), payloads.candles_INDIAVIX))
+            if path == "/v1/compute/cache/quotes_v2":
+                symbols = body.get("trading_symbols") or []
+                return self._send(200, payloads.get("quotes_v2", "stocks", payloads.quotes_v2, symbols))
+        elif host == "straddle-chart.financedeft.com" and path.endswith(".json"):
+            key = path[1:-len(".json")]
+            if key.split("_")[0] not in MARKETS:
+                return self._send(404, {"error": "not found"})
+            return self._send(200, payloads.get("straddle", key, payloads.straddle))
+        elif host == "www.nseindia.com":
+            if path == "/api/historical/indicesHistory":
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                symbol = query.get("indexType", "")
+                return self._send(200, payloads.get("indicesHistory", symbol, payloads.indicesHistory,
+                                                    query.get("from"), query.get("to")))
+            if path == "/":
+                return self._send(200, b"<html></html>", "text/html", {"Set-Cookie": "nsit=stub; Path=/"})
+        self._send(404, {"error": f"no stub for {host}{path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, payloads, latency=0.0, jitter=0.0):
+        super().__init__(address, StubHandler)
+        self.payloads = payloads
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.stats_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start(payloads=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0):
+    """
+    Run a stub server on a background thread (port 0 picks a free port).
+    """
+    server = StubServer((host, port), payloads or UpstreamPayloads(), latency, jitter)
+    threading.Thread(target=server.serve_forever, name="stub-upstream", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Sensibull, straddle and NSE endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--captures", help="payload_capture directory to replay (default: synthetic payloads)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random extra latency")
+    parser.add_argument("--tokens", help="also write the synthetic tokens.csv here")
+    args = parser.parse_args()
+
+    payloads = UpstreamPayloads()
+    if args.captures:
+        print(f"📼 Loaded {payloads.load(args.captures)} recorded payloads from {args.captures}")
+    if args.tokens:
+        print(f"✅ Synthetic token map written to {write_tokens_csv(args.tokens)}")
+    server = StubServer((args.host, args.port), payloads, args.latency, args.jitter)
+    print(f"🚀 Stub upstream on {server.base_url} (latency {args.latency}s ± {args.jitter}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,204 @@
+import math
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+# === SETTINGS ===
+PERIOD = 60             # seconds between slots
+GRACE_SECONDS = 5       # "skip" still runs a slot that is at most this late
+MAX_CATCH_UP = 5        # "catch_up" replays at most this many missed slots
+RESYNC_SECONDS = 1.0    # re-anchor to the wall clock when it steps by more than this
+
+# What to do with slots that came due while the previous run was still going:
+#   skip      run the latest slot if it is within GRACE_SECONDS, otherwise wait for the next one
+#   coalesce  run once, right away, for the latest slot
+#   catch_up  run every missed slot in order (up to MAX_CATCH_UP)
+POLICIES = ("skip", "coalesce", "catch_up")
+
+
+class Job:
+    def __init__(self, name, func, second, after, policy):
+        self.name = name
+        self.func = func
+        self.second = second
+        self.after = after
+        self.policy = policy
+        self.last_slot = None       # slot of the last run (or skipped slot)
+        self.resolved = None        # latest slot dependents may run for: finished or skipped
+        self.ready_at = None        # when the dependencies resolved `ready`, for dependent jobs
+        self.ready = None
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.lag = None
+        self.duration = None
+
+
+class TickScheduler:
+    """
+    Runs every collector job from one thread on fixed wall-clock slots
+    (xx:xx:second each minute), timed with the monotonic clock so sleeps
+    never drift. A job runs at most once per slot and never overlaps
+    itself; a job with `after` has no slot of its own and runs for a
+    minute once all of its dependencies finished (or skipped) that minute.
+    Jobs are called as func(slot) with the slot's datetime.
+    """
+    def __init__(self, period=PERIOD, grace=GRACE_SECONDS):
+        self.period = period
+        self.grace = grace
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._executor = None
+        self._anchor()
+
+    def add(self, name, func, second=0, after=(), policy="skip"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy!r}, expected one of {POLICIES}")
+        for dep in after:
+            if dep not in self.jobs:
+                raise ValueError(f"[{name}] depends on unknown job {dep!r}")
+        self.jobs[name] = Job(name, func, second, list(after), policy)
+        return self.jobs[name]
+
+    # === Time ===
+    def _anchor(self):
+        self._wall0 = time.time()
+        self._mono0 = time.monotonic()
+
+    def _now(self):
+        now = self._wall0 + (time.monotonic() - self._mono0)
+        if abs(time.time() - now) > RESYNC_SECONDS:
+            logging.warning(f"[Scheduler] Wall clock stepped by {time.time() - now:+.1f}s, re-anchoring")
+            self._anchor()
+            now = self._wall0
+        return now
+
+    def _slot(self, job, now):
+        # Latest slot (epoch seconds) of a timed job at or before `now`
+        return math.floor((now - job.second) / self.period) * self.period + job.second
+
+    # === Dispatch ===
+    def _pending(self, job, now):
+        """
+        Slots that came due since the job's last run, oldest first, and when they came due.
+        """
+        if job.after:
+            ready = min(self.jobs[dep].resolved for dep in job.after) if all(
+                self.jobs[dep].resolved is not None for dep in job.after) else None
+            if ready is not None and ready != job.ready:
+                job.ready, job.ready_at = ready, now
+            if ready is None:
+                return [], None
+            latest, due_at = ready, job.ready_at
+        else:
+            latest = self._slot(job, now)
+            due_at = latest
+        if job.last_slot is None:
+            return [latest], due_at
+        count = int(round((latest - job.last_slot) / self.period))
+        return [job.last_slot + i * self.period for i in range(1, count + 1)], due_at
+
+    def _select(self, job, pending, due_at, now):
+        """
+        The slot to run now under the job's overrun policy (None to wait), counting dropped slots.
+        """
+        if job.last_slot is None:
+            return pending[-1]       # first run straight away, like the old worker loops
+        if job.policy == "catch_up":
+            dropped = pending[:-MAX_CATCH_UP]
+            chosen = pending[len(dropped)]
+        elif job.policy == "coalesce" or now - due_at <= self.grace:
+            dropped, chosen = pending[:-1], pending[-1]
+        else:
+            dropped, chosen = pending, None
+        if dropped:
+            job.skipped += len(dropped)
+            metrics.inc("collector_slots_skipped_total", len(dropped), job=job.name, policy=job.policy)
+            logging.warning(f"[{job.name}] Skipped {len(dropped)} slot(s) up to "
+                            f"{datetime.fromtimestamp(dropped[-1]):%H:%M:%S} ({job.policy})")
+            job.last_slot = dropped[-1]
+            job.resolved = job.last_slot
+        return chosen
+
+    def _dispatch(self, now):
+        for job in self.jobs.values():
+            pending, due_at = self._pending(job, now)
+            if job.running or not pending:
+                continue
+            slot = self._select(job, pending, due_at, now)
+            if slot is None:
+                continue
+            lag = max(0.0, now - (due_at if job.after else slot))
+            job.running = True
+            job.last_slot = slot
+            self._executor.submit(self._run, job, slot, lag)
+
+    def _run(self, job, slot, lag):
+        started = time.monotonic()
+        try:
+            job.func(datetime.fromtimestamp(slot))
+        except Exception as e:
+            logging.error(f"[{job.name}] Error: {e}")
+        duration = time.monotonic() - started
+        with self._lock:
+            finished = self._now()
+            job.running = False
+            job.resolved = slot
+            job.runs += 1
+            job.lag, job.duration = lag, duration
+            metrics.observe("collector_cycle_seconds", duration, job=job.name)
+            metrics.set_gauge("collector_cycle_lag_seconds", lag, job=job.name)
+            metrics.inc("collector_cycles_total", job=job.name)
+            if finished >= slot + self.period:
+                job.overruns += 1
+                metrics.inc("collector_cycle_overruns_total", job=job.name)
+                logging.warning(f"[{job.name}] Cycle for {datetime.fromtimestamp(slot):%H:%M:%S} overran "
+                                f"the next slot ({duration:.1f}s)")
+        self._wake.set()
+
+    def _next_wake(self, now):
+        # Seconds until the next timed slot; completions wake the loop early
+        timed = [self._slot(job, now) + self.period for job in self.jobs.values() if not job.after]
+        return max(0.0, min(timed) - now) if timed else self.period
+
+    def run(self, stop_event):
+        """
+        Dispatch jobs until `stop_event` is set, then wait for the running ones.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=len(self.jobs), thread_name_prefix="tick")
+        try:
+            while not stop_event.is_set():
+                self._wake.clear()
+                with self._lock:
+                    now = self._now()
+                    self._dispatch(now)
+                    timeout = self._next_wake(now)
+                # Short waits so stop_event is noticed within a second
+                self._wake.wait(min(timeout, 1.0))
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def status(self):
+        """
+        Per job: last slot, lag and duration of the last run, and skipped/overrun counts.
+        """
+        with self._lock:
+            return {
+                job.name: {
+                    "last_slot": datetime.fromtimestamp(job.last_slot).isoformat() if job.last_slot else None,
+                    "running": job.running,
+                    "lag_seconds": round(job.lag, 3) if job.lag is not None else None,
+                    "duration_seconds": round(job.duration, 3) if job.duration is not None else None,
+                    "runs": job.runs,
+                    "skipped": job.skipped,
+                    "overruns": job.overruns,
+                    "policy": job.policy,
+                    "after": job.after,
+                }
+                for job in self.jobs.values()
+            }
@@ -0,0 +1,35 @@
+import os
+import sys
+import glob
+import pytest
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+import indicators  # noqa: E402
+
+GOLDEN_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, "*_IndicatorSentiments.csv")))
+
+
+def mismatches(result, expected):
+    return {col: v for col, v in indicators.compare(result, expected).items() if v}
+
+
+@pytest.mark.parametrize("csv_path", GOLDEN_CSVS, ids=os.path.basename)
+def test_golden_file(csv_path):
+    golden = pd.read_csv(csv_path)
+    ohlc = golden[["datetime", "High", "Low", "Close"]]
+    assert mismatches(indicators.compute_indicators(ohlc), golden) == {}
+    assert mismatches(indicators.compute_incremental(ohlc), golden) == {}
+
+
+def test_flat_bars():
+    # A run of bars with high == low == previous close: zero ATR and zero band width
+    ohlc = pd.read_csv(GOLDEN_CSVS[0])[["datetime", "High", "Low", "Close"]].iloc[:200].copy()
+    ohlc.loc[60:100, ["High", "Low", "Close"]] = ohlc.loc[59, "Close"]
+    vectorized = indicators.compute_indicators(ohlc)
+    incremental = indicators.compute_incremental(ohlc)
+    assert mismatches(incremental, vectorized) == {}
+    assert vectorized.loc[80, "DI+"] == 0 and vectorized.loc[80, "DI-"] == 0
+    assert vectorized.loc[80, "BB_Width"] == 0
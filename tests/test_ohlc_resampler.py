@@ -0,0 +1,30 @@
+import os
+import sys
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+import ohlc_resampler  # noqa: E402
+
+MINUTE_CSV = os.path.join(REPO_DIR, "260105_minute_2025-09-01_2025-09-09.csv")
+
+
+def test_parse_minute_date_only_end_covers_the_day():
+    start = ohlc_resampler.parse_minute("2025-09-02")
+    end = ohlc_resampler.parse_minute("2025-09-02", end=True)
+    assert end - start == 24 * 60 - 1
+    assert ohlc_resampler.parse_minute("2025-09-02 10:30", end=True) == start + 10 * 60 + 30
+    assert ohlc_resampler.parse_minute(None, end=True) is None
+
+
+def test_get_with_date_only_end_includes_that_day(tmp_path):
+    bars = ohlc_resampler.MinuteBars.from_frame(pd.read_csv(MINUTE_CSV))
+    engine = ohlc_resampler.OHLCEngine(directory=str(tmp_path))
+    engine.add_minutes("260105", bars)
+    day = "2025-09-02"
+    result = engine.get("260105", "1m", ohlc_resampler.parse_minute(day), ohlc_resampler.parse_minute(day, end=True))
+    times = [row["time"] for row in ohlc_resampler.to_dicts(result)]
+    expected = sum(1 for t in pd.read_csv(MINUTE_CSV)["datetime"] if t.startswith(day))
+    assert expected and len(times) == expected
+    assert all(t.startswith(day) for t in times)
@@ -0,0 +1,22 @@
+import os
+import sys
+import glob
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, "backend"))
+
+from OIBasedSentiments import add_moving_averages, load_ohlc_as_snapshots, verify_vectorized  # noqa: E402
+
+# Bundled broker exports, used as stand-in input (Close as LTP, close change as net OI)
+BUNDLED_CSVS = sorted(glob.glob(os.path.join(REPO_DIR, "260105_*minute_*.csv")))
+
+
+@pytest.mark.parametrize("csv_path", BUNDLED_CSVS, ids=os.path.basename)
+def test_vectorized_rules_match_loop(csv_path):
+    df = add_moving_averages(load_ohlc_as_snapshots(csv_path))
+    assert verify_vectorized(df) == []
+
+
+def test_bundled_csvs_present():
+    assert BUNDLED_CSVS